@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.generator import SCALES, category_names, generate_budget, item_names
+from data.model import split_key
+from data.store import SUPER_CATEGORIES, BudgetStore
+
+BACKENDS = {"json": ".json", "sqlite": ".db", "sharded": ".shards", "binary": ".fbin"}
+
+# A benchmark is reported as regressed when its median grows by more than this factor
+DEFAULT_THRESHOLD = 1.25
+
+# Results are kept next to the benchmarks rather than wherever they were run from
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.json")
+
+def measure(function, repeat, prepare=None):
+    """Call function repeat times and return each call's duration in milliseconds.
+
+    prepare, if given, is called with the run number before each call and is not timed.
+    """
+    runs = []
+    for run in range(repeat):
+        if prepare is not None:
+            prepare(run)
+        start = time.perf_counter()
+        function()
+        runs.append((time.perf_counter() - start) * 1000)
+    return runs
+
+def bench_data(path, categories, repeat):
+    """Time loading, saving and the aggregate sweeps of one budget file. Return {name: runs}."""
+    from data.budget_data import BudgetData
+
+    results = {}
+    start = time.perf_counter()
+    budget_data = BudgetData(path)
+    results["open"] = [(time.perf_counter() - start) * 1000]
+    periods = [split_key(key) for key in budget_data.month_keys()]
+    names = category_names(categories)
+    item = item_names(1)[0]
+    # One month per year, so a save has to write to every year of a sharded budget
+    spread = list({year: (month, year) for month, year in periods}.values())
+
+    def category_sweep():
+        for month, year in periods:
+            for category in names:
+                budget_data.get_category_total(month, year, category)
+
+    def super_category_sweep():
+        for month, year in periods:
+            for super_category in SUPER_CATEGORIES:
+                budget_data.get_super_category_total(month, year, super_category)
+
+    def edit(run):
+        # Without changes a save has nothing to write on the SQLite and sharded backends
+        for month, year in spread:
+            budget_data.update_expense(month, year, names[0], item, run + 1, run + 1)
+
+    def save():
+        budget_data.save_data()
+        budget_data.flush()
+
+    budget_data.flush()
+    results["load_data"] = _time_reload(path, repeat)
+    results["save_data"] = measure(save, repeat, edit)
+    results["category_total_sweep"] = measure(category_sweep, repeat)
+    results["super_category_total_sweep"] = measure(super_category_sweep, repeat)
+    return budget_data, results, periods
+
+def _time_reload(path, repeat):
+    """Time opening a budget afresh and reading every month of it from the backend."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        budget = BudgetStore(path)
+        for key in budget.month_keys():
+            budget.data[key]  # Lazy backends read the month from disk here
+        runs.append((time.perf_counter() - start) * 1000)
+        budget.close()
+    return runs
+
+def bench_ui(budget_data, periods, repeat):
+    """Time each page's refresh_ui, including the repaint it causes. Return {name: runs}."""
+    from PyQt5.QtWidgets import QApplication
+    from ui.analysis_page import AnalysisPage
+    from ui.input_page import InputPage
+    from ui.summary_page import SummaryPage
+
+    app = QApplication.instance() or QApplication([])
+    # Cycle through the latest year's months so every refresh shows a different one
+    latest = periods[-12:]
+    results = {}
+    for name, page_class in (("input_page_refresh", InputPage), ("summary_page_refresh", SummaryPage),
+                             ("analysis_page_refresh", AnalysisPage)):
+        page = page_class(budget_data)
+        page.resize(1200, 800)
+        page.show()
+        app.processEvents()
+        runs = []
+        for index in range(repeat):
+            page.current_month, page.current_year = latest[index % len(latest)]
+            if page_class is AnalysisPage:
+                runs.append(_time_analysis_refresh(app, page))
+            else:
+                start = time.perf_counter()
+                page.refresh_ui()
+                app.processEvents()
+                runs.append((time.perf_counter() - start) * 1000)
+        results[name] = runs
+        page.close()
+        if page_class is AnalysisPage:
+            page.renderer.shutdown()
+    return results
+
+def _time_analysis_refresh(app, page, timeout=60):
+    """Time AnalysisPage.refresh_ui until both charts have been rendered off the cache."""
+    page.renderer.cache.clear()
+    ready = set()
+    record = lambda kind, pixmap: ready.add(kind)
+    page.renderer.chart_ready.connect(record)
+    start = time.perf_counter()
+    page.refresh_ui()
+    while len(ready) < 2 and time.perf_counter() - start < timeout:
+        app.processEvents()
+        time.sleep(0.001)
+    elapsed = (time.perf_counter() - start) * 1000
+    page.renderer.chart_ready.disconnect(record)
+    return elapsed
+
+def run(scales, backends, repeat, seed, include_ui, workdir):
+    """Generate each budget, benchmark it and return the result entries."""
+    entries = []
+    for scale in scales:
+        for backend in backends:
+            path = os.path.join(workdir, f"{scale}{BACKENDS[backend]}")
+            start = time.perf_counter()
+            years, categories, items = generate_budget(path, scale, seed)
+            print(f"{scale}/{backend}: generated {years}x{categories}x{items} in {time.perf_counter() - start:.1f} s",
+                  file=sys.stderr)
+            budget_data, results, periods = bench_data(path, categories, repeat)
+            if include_ui:
+                results.update(bench_ui(budget_data, periods, repeat))
+            budget_data.close()
+            for name, runs in results.items():
+                entry = {"scale": scale, "backend": backend, "benchmark": name, "years": years,
+                         "categories": categories, "items": items, "runs_ms": [round(run, 3) for run in runs],
+                         "min_ms": round(min(runs), 3), "median_ms": round(statistics.median(runs), 3)}
+                entries.append(entry)
+                print(f"  {name:<28} median {entry['median_ms']:10.2f} ms  min {entry['min_ms']:10.2f} ms",
+                      file=sys.stderr)
+    return entries
+
+def compare(results, baseline, threshold):
+    """Print each benchmark's median against a baseline run's and return the names that regressed."""
+    previous = {(entry["scale"], entry["backend"], entry["benchmark"]): entry["median_ms"] for entry in baseline["results"]}
+    regressed = []
+    for entry in results:
+        key = (entry["scale"], entry["backend"], entry["benchmark"])
+        if key not in previous or previous[key] <= 0:
+            continue
+        ratio = entry["median_ms"] / previous[key]
+        flag = "  REGRESSED" if ratio > threshold else ""
+        print(f"{'/'.join(key):<48} {previous[key]:10.2f} -> {entry['median_ms']:10.2f} ms  x{ratio:.2f}{flag}")
+        if ratio > threshold:
+            regressed.append("/".join(key))
+    return regressed
+
+def main(argv=None):
+    """Run the benchmarks; return the process exit code."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Time the budget data layer and pages on synthetic budgets.")
+    parser.add_argument("--scales", default="small,medium",
+                        help=f"comma-separated scales from {', '.join(SCALES)} (default: small,medium)")
+    parser.add_argument("--backends", default=",".join(BACKENDS),
+                        help=f"comma-separated storage backends from {', '.join(BACKENDS)} (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="generator seed (default: 0)")
+    parser.add_argument("--no-ui", action="store_true", help="skip the page refresh benchmarks")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT,
+                        help="where to write the results (default: benchmarks/benchmark_results.json)")
+    parser.add_argument("--compare", help="results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"median ratio counted as a regression (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--workdir", help="where to write the generated budgets (default: a temporary directory)")
+    args = parser.parse_args(argv)
+
+    scales = args.scales.split(",")
+    backends = args.backends.split(",")
+    for name, allowed in (("scale", SCALES), ("backend", BACKENDS)):
+        unknown = [value for value in (scales if name == "scale" else backends) if value not in allowed]
+        if unknown:
+            parser.error(f"unknown {name}: {', '.join(unknown)}")
+    # Pages are measured without a display server
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="familybudget-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        entries = run(scales, backends, args.repeat, args.seed, not args.no_ui, workdir)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": entries,
+    }
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressed = compare(entries, json.load(file), args.threshold)
+        if regressed:
+            print(f"{len(regressed)} benchmark(s) regressed", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import random
+import shutil
+import sys
+
+from data.model import MONTHS, Category, ExpenseItem, Month, month_key
+from data.storage import open_storage
+from data.store import SUPER_CATEGORIES
+
+# Budget sizes as (years, categories per month, expense items per category)
+SCALES = {
+    "small": (2, 8, 6),
+    "medium": (10, 20, 12),
+    "large": (40, 40, 20),
+    "huge": (100, 50, 30),
+}
+
+FIRST_YEAR = 2000
+
+def category_names(count):
+    return [f"Category {index + 1:02d}" for index in range(count)]
+
+def item_names(count):
+    return [f"Item {index + 1:02d}" for index in range(count)]
+
+def generate_months(years, categories, items, seed=0, first_year=FIRST_YEAR):
+    """Return {month key: Month} for a synthetic household budget.
+
+    The same seed always gives the same budget. Like a real household, every
+    month has the same categories, each with a fixed super category, and
+    actual costs scatter around the projected ones.
+    """
+    rng = random.Random(seed)
+    intern = sys.intern
+    names = [intern(name) for name in item_names(items)]
+    plan = [(intern(name), rng.choice(SUPER_CATEGORIES)) for name in category_names(categories)]
+    months = {}
+    for year in range(first_year, first_year + years):
+        for month in MONTHS:
+            month_data = Month()
+            for category, super_category in plan:
+                expenses = {}
+                for item in names:
+                    projected = round(rng.uniform(10, 1000), 2)
+                    expenses[item] = ExpenseItem(projected, round(projected * rng.uniform(0.5, 1.5), 2))
+                month_data.categories[category] = Category(super_category, expenses)
+            months[month_key(month, year)] = month_data
+    return months
+
+def write_budget(path, months):
+    """Write months as a budget file; the extension picks JSON, SQLite, shards or a binary snapshot, as it does for BudgetData."""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    for stale in (path, path + ".journal"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    storage = open_storage(path, compact_threshold=None)
+    storage.import_months(months)
+    storage.close()
+
+def generate_budget(path, scale, seed=0):
+    """Write the budget for a named scale to path and return its (years, categories, items)."""
+    shape = SCALES[scale]
+    write_budget(path, generate_months(*shape, seed=seed))
+    return shape
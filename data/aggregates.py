@@ -0,0 +1,105 @@
+from math import fsum
+
+from data.rollups import RollupIndex
+
+class AggregateIndex:
+    """Projected and actual totals kept per (month, category), (month, super category) and month.
+
+    BudgetData feeds every mutation in as a delta, so reading a total is a
+    dictionary lookup instead of a sum over expense items. The same deltas
+    keep the quarter, year and decade totals in self.rollups current.
+    """
+
+    def __init__(self):
+        self.categories = {}  # key -> {category: [projected, actual]}
+        self.super_categories = {}  # key -> {super_category: [projected, actual]}
+        self.months = {}  # key -> [projected, actual]
+        self.overall = {}  # category -> [projected, actual] across every month
+        self.rollups = RollupIndex()
+
+    def rebuild(self, rows):
+        """Recompute everything from (key, category, super_category, projected, actual) rows."""
+        self.categories.clear()
+        self.super_categories.clear()
+        self.months.clear()
+        self.overall.clear()
+        self.rollups.clear()
+        for key, category, super_category, projected, actual in rows:
+            self.add(key, category, super_category, projected, actual)
+
+    def index_month(self, key, month_data):
+        """(Re)index one Month, dropping whatever was indexed for it before."""
+        self.drop_month(key)
+        for category, data in month_data.categories.items():
+            projected, actual = data.totals()
+            self.add(key, category, data.super_category, projected, actual)
+
+    def reindex(self, months):
+        """Recompute everything fed by {key: Month, or None for a month that is gone} from exact sums.
+
+        Deltas leave float rounding behind, so an undone import can total
+        -5.7e-10 instead of 0. BudgetStore calls this once per batch.
+        """
+        categories = set()
+        for key, month_data in months.items():
+            categories.update(self.categories.get(key, ()))
+            if month_data is None:
+                self.drop_month(key)
+            else:
+                self.index_month(key, month_data)
+                categories.update(month_data.categories)
+        self._recount(categories)
+        self.rollups.reindex(months, self.categories, self.super_categories, self.months)
+
+    def drop_month(self, key):
+        """Forget every total that belongs to a month."""
+        categories = self.categories.pop(key, {})
+        for category, (projected, actual) in categories.items():
+            self._bump(self.overall, category, -projected, -actual)
+        self.rollups.drop_month(key, categories, self.super_categories.pop(key, {}), self.months.pop(key, None))
+
+    def add(self, key, category, super_category, projected, actual):
+        """Apply a projected/actual delta to every total the category contributes to."""
+        self._bump(self.categories.setdefault(key, {}), category, projected, actual)
+        self._bump(self.super_categories.setdefault(key, {}), super_category, projected, actual)
+        self._bump(self.months, key, projected, actual)
+        self._bump(self.overall, category, projected, actual)
+        self.rollups.add(key, category, super_category, projected, actual)
+
+    def remove_category(self, key, category, super_category):
+        """Subtract a category's totals and forget it."""
+        projected, actual = self.categories.get(key, {}).pop(category, (0, 0))
+        self._bump(self.super_categories.setdefault(key, {}), super_category, -projected, -actual)
+        self._bump(self.months, key, -projected, -actual)
+        self._recount([category])
+        self.rollups.add(key, category, super_category, -projected, -actual)
+
+    def category_total(self, key, category):
+        return tuple(self.categories.get(key, {}).get(category, (0, 0)))
+
+    def super_category_total(self, key, super_category):
+        return tuple(self.super_categories.get(key, {}).get(super_category, (0, 0)))
+
+    def month_total(self, key):
+        return tuple(self.months.get(key, (0, 0)))
+
+    def overall_totals(self):
+        """Return {category: (projected, actual)} summed over every month."""
+        return {category: tuple(total) for category, total in self.overall.items()}
+
+    def _recount(self, categories):
+        """Sum the overall totals of some categories afresh, forgetting those no month has any more."""
+        for category in categories:
+            totals = [month[category] for month in self.categories.values() if category in month]
+            if totals:
+                self.overall[category] = [fsum(total[0] for total in totals), fsum(total[1] for total in totals)]
+            else:
+                self.overall.pop(category, None)
+
+    def _bump(self, totals, index_key, projected, actual):
+        total = totals.get(index_key)
+        if total is None:
+            totals[index_key] = [projected, actual]
+        else:
+            total[0] += projected
+            total[1] += actual
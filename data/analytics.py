@@ -0,0 +1,144 @@
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from data.model import MONTHS, key_to_label, month_key
+from utils.instrumentation import timed
+
+class BudgetFrame:
+    """Columnar view of BudgetData with one row per expense item, for vectorized analysis.
+
+    Columns are kept per month and only the months whose version changed since
+    the last call are rebuilt; the full frame is then a cheap concatenation.
+    A frame can also cover just a range of months, so a chart of one year
+    never makes a lazily loaded budget read every stored month.
+    """
+
+    COLUMNS = ["key", "year", "month", "month_number", "category", "super_category", "item", "projected", "actual"]
+
+    def __init__(self, budget_data):
+        self.budget_data = budget_data
+        self._blocks = {}  # key -> (month version, category, super_category, item, projected, actual)
+        self._names = []  # Shared string table; blocks hold integer codes into it
+        self._codes = {}
+        self._frames = {}  # (first, last) -> DataFrame, for self._version
+        self._version = None
+
+    @timed()
+    def frame(self, first=None, last=None):
+        """Return the up-to-date DataFrame, sorted chronologically.
+
+        With first and last, only the months with keys in [first, last) are
+        included and only those are read from the budget.
+        """
+        if self._version != self.budget_data.version:
+            self._frames = {}
+            self._version = self.budget_data.version
+        frame = self._frames.get((first, last))
+        if frame is not None:
+            return frame
+        keys = self.budget_data.month_keys()  # Ordinal keys, already in time order
+        stored = set(keys)
+        self._blocks = {key: block for key, block in self._blocks.items() if key in stored}  # Drop deleted months
+        if first is not None:
+            keys = keys[bisect_left(keys, first):bisect_left(keys, last)]
+        blocks = self._blocks
+        for key in keys:
+            version = self.budget_data.month_versions.get(key, 0)
+            block = blocks.get(key)
+            if block is None or block[0] != version:
+                blocks[key] = self._build_block(version, self.budget_data.data[key])
+        frame = self._frames[(first, last)] = self._concat(keys, blocks)
+        return frame
+
+    def monthly_trends(self):
+        """Projected and actual totals per month, in chronological order."""
+        frame = self.frame()
+        trends = frame.groupby("key", sort=True)[["projected", "actual"]].sum()
+        trends.index = [key_to_label(key) for key in trends.index]
+        return trends
+
+    @timed()
+    def year_trends(self, year, frame=None):
+        """Projected and actual totals for each month of one year, NaN where a month has no budget.
+
+        Like category_performance, this can work on a frame returned earlier by
+        frame(). Those are never modified afterwards, so another thread may
+        aggregate one while the budget keeps changing.
+        """
+        first = int(year) * 12
+        trends = self._rows(first, first + 12, frame).groupby("key", sort=True)[["projected", "actual"]].sum()
+        trends = trends.reindex(range(first, first + 12))
+        trends.index = MONTHS
+        return trends
+
+    @timed()
+    def category_performance(self, month=None, year=None, frame=None):
+        """Projected and actual totals per category, across every month or for one month."""
+        if frame is None:
+            frame = self.frame()
+        if month is not None:
+            key = month_key(month, year)
+            frame = self._rows(key, key + 1, frame)
+        return frame.groupby("category", sort=False, observed=True)[["projected", "actual"]].sum()
+
+    def variance(self, by="category"):
+        """Projected minus actual per group, with the variance as a percentage of projected."""
+        frame = self.frame()
+        totals = frame.groupby(by, sort=False, observed=True)[["projected", "actual"]].sum()
+        totals["variance"] = totals["projected"] - totals["actual"]
+        projected = totals["projected"].to_numpy()
+        totals["variance_pct"] = np.divide(totals["variance"].to_numpy() * 100, projected,
+                                           out=np.zeros(len(totals)), where=projected != 0)
+        return totals
+
+    def rolling_average(self, window=3):
+        """Rolling mean of the monthly trends over `window` months."""
+        return self.monthly_trends().rolling(window, min_periods=1).mean()
+
+    def _rows(self, first, last, frame=None):
+        """Return the rows whose key is in [first, last), using the frame's time order."""
+        if frame is None:
+            frame = self.frame()
+        start, stop = np.searchsorted(frame["key"].to_numpy(), [first, last])
+        return frame.iloc[start:stop]
+
+    def _build_block(self, version, month_data):
+        categories, super_categories, items, projected, actual = [], [], [], [], []
+        code = self._code
+        for category, data in month_data.categories.items():
+            category_code = code(category)
+            super_code = code(data.super_category)
+            for item, expense in data.expenses.items():
+                categories.append(category_code)
+                super_categories.append(super_code)
+                items.append(code(item))
+                projected.append(expense.projected)
+                actual.append(expense.actual)
+        return (version, np.array(categories, dtype=np.int32), np.array(super_categories, dtype=np.int32),
+                np.array(items, dtype=np.int32), np.array(projected, dtype=float), np.array(actual, dtype=float))
+
+    def _code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._names)
+            self._names.append(name)
+        return code
+
+    def _concat(self, keys, blocks):
+        counts = np.array([len(blocks[key][3]) for key in keys], dtype=np.int64)
+        key_column = np.repeat(np.array(keys, dtype=np.int64), counts)
+        month_codes = (key_column % 12).astype(np.int8)
+        columns = {
+            "key": key_column,
+            "year": (key_column // 12).astype(np.int32),
+            "month": pd.Categorical.from_codes(month_codes, categories=MONTHS),
+            "month_number": month_codes + 1,
+        }
+        for name, index in (("category", 1), ("super_category", 2), ("item", 3)):
+            codes = np.concatenate([blocks[key][index] for key in keys]) if keys else np.array([], dtype=np.int32)
+            columns[name] = pd.Categorical.from_codes(codes, categories=pd.Index(self._names, dtype=object))
+        for name, index in (("projected", 4), ("actual", 5)):
+            columns[name] = np.concatenate([blocks[key][index] for key in keys]) if keys else np.array([], dtype=float)
+        return pd.DataFrame(columns, columns=self.COLUMNS)
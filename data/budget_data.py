@@ -1,224 +1,52 @@
-import json
 from PyQt5.QtCore import QObject, pyqtSignal
-from collections import defaultdict
-import os
+from PyQt5.QtWidgets import QUndoCommand, QUndoStack
 
-class BudgetData(QObject):
-    # Define a signal that will be emitted when data changes
-    data_changed = pyqtSignal()
-
-    def __init__(self, data_file="budget_data.json"):
-        super().__init__()
-        self.data_file = data_file
-        self.data = defaultdict(lambda: {
-            "categories": {
-                "Housing": {
-                    "super_category": "NEEDS",
-                    "expenses": {
-                        "Mortgage/Rent": {"projected": 0, "actual": 0},
-                        "Utilities (Electricity, Gas, Water)": {"projected": 0, "actual": 0},
-                        "Cable": {"projected": 0, "actual": 0},
-                        "Waste Removal": {"projected": 0, "actual": 0},
-                        "Maintenance": {"projected": 0, "actual": 0},
-                        "Supplies": {"projected": 0, "actual": 0},
-                    },
-                },
-                "Transportation": {
-                    "super_category": "NEEDS",
-                    "expenses": {
-                        "Car Payment": {"projected": 0, "actual": 0},
-                        "Gas": {"projected": 0, "actual": 0},
-                        "Insurance": {"projected": 0, "actual": 0},
-                        "Maintenance": {"projected": 0, "actual": 0},
-                        "Public Transportation": {"projected": 0, "actual": 0},
-                    },
-                },
-                "Food": {
-                    "super_category": "NEEDS",
-                    "expenses": {
-                        "Groceries": {"projected": 0, "actual": 0},
-                        "Dining Out": {"projected": 0, "actual": 0},
-                    },
-                },
-                "Entertainment": {
-                    "super_category": "FUN",
-                    "expenses": {
-                        "Movies": {"projected": 0, "actual": 0},
-                        "Concerts": {"projected": 0, "actual": 0},
-                        "Sports": {"projected": 0, "actual": 0},
-                    },
-                },
-                "Savings": {
-                    "super_category": "FUTURE",
-                    "expenses": {
-                        "Emergency Fund": {"projected": 0, "actual": 0},
-                        "Retirement": {"projected": 0, "actual": 0},
-                        "Investments": {"projected": 0, "actual": 0},
-                    },
-                },
-                "Health": {
-                    "super_category": "NEEDS",
-                    "expenses": {
-                        "Insurance": {"projected": 0, "actual": 0},
-                        "Medication": {"projected": 0, "actual": 0},
-                        "Doctor Visits": {"projected": 0, "actual": 0},
-                    },
-                },
-                "Insurance": {
-                    "super_category": "NEEDS",
-                    "expenses": {
-                        "Health Insurance": {"projected": 0, "actual": 0},
-                        "Life Insurance": {"projected": 0, "actual": 0},
-                        "Auto Insurance": {"projected": 0, "actual": 0},
-                    },
-                },
-            }
-        })
-        self.load_data()  # Load data from JSON file
-
-    def add_category(self, month, year, category, super_category):
-        """Add a new category with a super category."""
-        key = f"{month}_{year}"
-        if category not in self.data[key]["categories"]:
-            self.data[key]["categories"][category] = {"super_category": super_category, "expenses": {}}
-            self.data_changed.emit()  # Emit signal when data changes
-            self.save_data()  # Save data to JSON file
-
-    def remove_category(self, month, year, category):
-        """Remove a category and its expenses."""
-        key = f"{month}_{year}"
-        if category in self.data[key]["categories"]:
-            del self.data[key]["categories"][category]
-            self.data_changed.emit()  # Emit signal when data changes
-            self.save_data()  # Save data to JSON file
-
-    def add_expense(self, month, year, category, expense_item, projected=0, actual=0):
-        """Add an expense item under a category."""
-        key = f"{month}_{year}"
-        if category in self.data[key]["categories"]:
-            self.data[key]["categories"][category]["expenses"][expense_item] = {
-                "projected": projected,
-                "actual": actual,
-            }
-            self.data_changed.emit()  # Emit signal when data changes
-            self.save_data()  # Save data to JSON file
+from data.store import BudgetStore
 
-    def remove_expense(self, month, year, category, expense_item):
-        """Remove an expense item from a category."""
-        key = f"{month}_{year}"
-        if category in self.data[key]["categories"] and expense_item in self.data[key]["categories"][category]["expenses"]:
-            del self.data[key]["categories"][category]["expenses"][expense_item]
-            self.data_changed.emit()  # Emit signal when data changes
-            self.save_data()  # Save data to JSON file
+class BudgetData(BudgetStore, QObject):
+    """BudgetStore for the GUI: announces changes through Qt signals.
 
-    def update_expense(self, month, year, category, expense_item, projected, actual):
-        """Update the projected and actual costs for an expense item."""
-        key = f"{month}_{year}"
-        if category in self.data[key]["categories"] and expense_item in self.data[key]["categories"][category]["expenses"]:
-            self.data[key]["categories"][category]["expenses"][expense_item]["projected"] = projected
-            self.data[key]["categories"][category]["expenses"][expense_item]["actual"] = actual
-            self.data_changed.emit()  # Emit signal when data changes
-            self.save_data()  # Save data to JSON file
+    Everything else, including persistence and the aggregate caches, lives in
+    data.store so that it can run without Qt. The undo history is mirrored on
+    undo_stack, one command per step, so the GUI should undo through it.
+    """
 
-    def get_category_total(self, month, year, category):
-        """Calculate the total projected and actual costs for a category."""
-        key = f"{month}_{year}"
-        if category in self.data[key]["categories"]:
-            projected_total = sum(expense["projected"] for expense in self.data[key]["categories"][category]["expenses"].values())
-            actual_total = sum(expense["actual"] for expense in self.data[key]["categories"][category]["expenses"].values())
-            return projected_total, actual_total
-        return 0, 0
-
-    def get_super_category_total(self, month, year, super_category):
-        """Calculate the total projected and actual costs for a super category."""
-        key = f"{month}_{year}"
-        projected_total = 0
-        actual_total = 0
-        for category, data in self.data[key]["categories"].items():
-            if data["super_category"] == super_category:
-                projected, actual = self.get_category_total(month, year, category)
-                projected_total += projected
-                actual_total += actual
-        return projected_total, actual_total
-
-    def get_data(self, month, year):
-        """Return the current budget data for a specific month and year."""
-        key = f"{month}_{year}"
-        # Initialize the month and year if not present
-        if key not in self.data:
-            self.data[key] = {
-                "categories": {
-                    "Housing": {
-                        "super_category": "NEEDS",
-                        "expenses": {
-                            "Mortgage/Rent": {"projected": 0, "actual": 0},
-                            "Utilities (Electricity, Gas, Water)": {"projected": 0, "actual": 0},
-                            "Cable": {"projected": 0, "actual": 0},
-                            "Waste Removal": {"projected": 0, "actual": 0},
-                            "Maintenance": {"projected": 0, "actual": 0},
-                            "Supplies": {"projected": 0, "actual": 0},
-                        },
-                    },
-                    "Transportation": {
-                        "super_category": "NEEDS",
-                        "expenses": {
-                            "Car Payment": {"projected": 0, "actual": 0},
-                            "Gas": {"projected": 0, "actual": 0},
-                            "Insurance": {"projected": 0, "actual": 0},
-                            "Maintenance": {"projected": 0, "actual": 0},
-                            "Public Transportation": {"projected": 0, "actual": 0},
-                        },
-                    },
-                    "Food": {
-                        "super_category": "NEEDS",
-                        "expenses": {
-                            "Groceries": {"projected": 0, "actual": 0},
-                            "Dining Out": {"projected": 0, "actual": 0},
-                        },
-                    },
-                    "Entertainment": {
-                        "super_category": "FUN",
-                        "expenses": {
-                            "Movies": {"projected": 0, "actual": 0},
-                            "Concerts": {"projected": 0, "actual": 0},
-                            "Sports": {"projected": 0, "actual": 0},
-                        },
-                    },
-                    "Savings": {
-                        "super_category": "FUTURE",
-                        "expenses": {
-                            "Emergency Fund": {"projected": 0, "actual": 0},
-                            "Retirement": {"projected": 0, "actual": 0},
-                            "Investments": {"projected": 0, "actual": 0},
-                        },
-                    },
-                    "Health": {
-                        "super_category": "NEEDS",
-                        "expenses": {
-                            "Insurance": {"projected": 0, "actual": 0},
-                            "Medication": {"projected": 0, "actual": 0},
-                            "Doctor Visits": {"projected": 0, "actual": 0},
-                        },
-                    },
-                    "Insurance": {
-                        "super_category": "NEEDS",
-                        "expenses": {
-                            "Health Insurance": {"projected": 0, "actual": 0},
-                            "Life Insurance": {"projected": 0, "actual": 0},
-                            "Auto Insurance": {"projected": 0, "actual": 0},
-                        },
-                    },
-                }
-            }
-        return self.data[key]
-
-    def save_data(self):
-        """Save the budget data to a JSON file."""
-        with open(self.data_file, 'w') as file:
-            json.dump(self.data, file)
-
-    def load_data(self):
-        """Load the budget data from a JSON file."""
-        if os.path.exists(self.data_file):
-            with open(self.data_file, 'r') as file:
-                self.data = json.load(file)
\ No newline at end of file
+    # Define a signal that will be emitted when data changes
+    data_changed = pyqtSignal()
+    # Emitted once per changed category or expense item with (month, year, category, expense_item, kind).
+    # expense_item is "" when the category itself was added or removed.
+    item_changed = pyqtSignal(str, int, str, str, str)
+
+    def __init__(self, data_file="budget_data.json", debug_aggregates=None, cache_years=None):
+        # Initialized explicitly: QObject's cooperative __init__ would call BudgetStore's without arguments
+        QObject.__init__(self)
+        BudgetStore.__init__(self, data_file, debug_aggregates, cache_years)
+        self.listeners.append(self._emit_signals)
+        self.undo_stack = QUndoStack(self)
+        self.undo_stack.setUndoLimit(self.HISTORY_LIMIT)
+        self.history_listeners.append(self._push_command)
+
+    def _emit_signals(self, changes):
+        self.data_changed.emit()  # Emit signal once per commit or batch
+        for (month, year, category, expense_item), kind in changes.items():
+            self.item_changed.emit(month, year, category, expense_item, kind)
+
+    def _push_command(self, description):
+        self.undo_stack.push(_HistoryCommand(self, description))
+
+class _HistoryCommand(QUndoCommand):
+    """One step of the store's undo history on the QUndoStack."""
+
+    def __init__(self, budget_data, description):
+        super().__init__(description)
+        self.budget_data = budget_data
+        self.pushed = True  # push() calls redo(), but the edit has already been made
+
+    def undo(self):
+        self.budget_data.undo()
+
+    def redo(self):
+        if self.pushed:
+            self.pushed = False
+            return
+        self.budget_data.redo()
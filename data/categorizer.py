@@ -0,0 +1,380 @@
+import json
+import os
+import re
+
+from data.importer import UNCATEGORIZED
+from data.persistence import write_atomic
+
+# Kinds of rule
+KEYWORD = "keyword"  # The words appear anywhere in the description
+PREFIX = "prefix"  # The description starts with the text
+REGEX = "regex"  # A regular expression matches somewhere in the description
+RULE_KINDS = (KEYWORD, PREFIX, REGEX)
+
+NO_MATCH = float("inf")
+
+REGEX_METACHARACTERS = set(".^$*+?{}[]()|")
+
+# A numbered backreference or conditional, which would point at the wrong group inside a combined pattern
+NUMBERED_REFERENCE = re.compile(r"\\[1-9]|\(\?\([1-9]")
+
+# Words that make up a merchant signature: letters only, at least two of them
+SIGNATURE_WORD = re.compile(r"[A-Z&']{2,}")
+
+def rules_path(data_file):
+    """Return where the categorization rules for a budget file are kept."""
+    return os.path.splitext(data_file)[0] + ".rules.json"
+
+def normalize(description):
+    """Upper-case a description and collapse its whitespace, as every matcher sees it."""
+    return " ".join(description.upper().split())
+
+def literal_prefix(pattern):
+    """Return the upper-cased literal text that every match of a regex starts with, or "".
+
+    Conservative: anything that is not a plain character, including alternation
+    anywhere in the pattern, ends the literal or rules it out.
+    """
+    if "|" in pattern:
+        return ""
+    index = 1 if pattern.startswith("^") else 0
+    chars = []
+    while index < len(pattern):
+        char = pattern[index]
+        step = 1
+        if char == "\\":
+            if index + 1 >= len(pattern) or pattern[index + 1].isalnum():
+                break  # A class such as \d or a backreference
+            char = pattern[index + 1]
+            step = 2
+        elif char in REGEX_METACHARACTERS:
+            break
+        if pattern[index + step:index + step + 1] in ("?", "*", "{"):
+            break  # The character is optional
+        chars.append(char)
+        index += step
+    return normalize("".join(chars)) if "".join(chars).strip() else ""
+
+def signature(description):
+    """Reduce a description to its merchant words, dropping store numbers and punctuation."""
+    return " ".join(SIGNATURE_WORD.findall(description.upper()))
+
+class Rule:
+    """Send descriptions matching a pattern to a category and expense item."""
+
+    def __init__(self, kind, pattern, category, item, super_category="NEEDS", priority=0):
+        if kind not in RULE_KINDS:
+            raise ValueError(f"Unknown rule kind: {kind}")
+        if kind == REGEX:
+            try:
+                re.compile(pattern)
+            except re.error as error:
+                raise ValueError(f"Invalid regex {pattern!r}: {error}") from None
+        self.kind = kind
+        self.pattern = pattern
+        self.category = category
+        self.item = item
+        self.super_category = super_category
+        self.priority = priority  # Higher wins; ties go to the rule added first
+
+    def target(self):
+        return self.category, self.item, self.super_category
+
+    def to_json(self):
+        return {"kind": self.kind, "pattern": self.pattern, "category": self.category, "item": self.item,
+                "super_category": self.super_category, "priority": self.priority}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["kind"], data["pattern"], data["category"], data["item"],
+                   data.get("super_category", "NEEDS"), data.get("priority", 0))
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds every keyword occurring in a text in one pass.
+
+    Besides the keyword rules it holds the literal "triggers" of regex rules,
+    so a regex is only run on texts that contain its literal part.
+    """
+
+    def __init__(self, keywords, triggers=()):
+        """keywords and triggers are lists of (text, rank) pairs; a lower rank is a better match."""
+        goto = [{}]
+        outputs = [None]  # None, or (best keyword rank, ranks of the triggers that end here)
+        for entries, is_trigger in ((keywords, False), (triggers, True)):
+            for text, rank in entries:
+                state = 0
+                for char in text:
+                    next_state = goto[state].get(char)
+                    if next_state is None:
+                        next_state = goto[state][char] = len(goto)
+                        goto.append({})
+                        outputs.append(None)
+                    state = next_state
+                outputs[state] = self._merge(outputs[state], (NO_MATCH, (rank,)) if is_trigger else (rank, ()))
+
+        # Breadth-first pass: fill in failure links, fold each state's failure outputs into its own
+        # and build a full transition table, so scanning never has to follow a failure chain
+        alphabet = {char for entries in (keywords, triggers) for text, _ in entries for char in text}
+        fail = [0] * len(goto)
+        delta = [dict() for _ in goto]
+        queue = []
+        for char in alphabet:
+            next_state = goto[0].get(char)
+            if next_state is not None:
+                delta[0][char] = next_state
+                queue.append(next_state)
+        for state in queue:
+            outputs[state] = self._merge(outputs[state], outputs[fail[state]])
+            for char in alphabet:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    target = delta[fail[state]].get(char)
+                    if target:
+                        delta[state][char] = target
+                else:
+                    fail[next_state] = delta[fail[state]].get(char, 0)
+                    delta[state][char] = next_state
+                    queue.append(next_state)
+        self.delta = delta
+        self.outputs = outputs
+
+    @staticmethod
+    def _merge(first, second):
+        if first is None:
+            return second
+        if second is None:
+            return first
+        return min(first[0], second[0]), first[1] + second[1]
+
+    def search(self, text):
+        """Return (best keyword rank or NO_MATCH, ranks of the triggers found) for a text."""
+        delta = self.delta
+        outputs = self.outputs
+        state = 0
+        found = NO_MATCH
+        triggered = ()
+        for char in text:
+            state = delta[state].get(char, 0)
+            output = outputs[state]
+            if output is not None:
+                if output[0] < found:
+                    found = output[0]
+                if output[1]:
+                    triggered += output[1]
+        return found, triggered
+
+class PrefixTrie:
+    """Trie of prefixes; finds the best-ranked prefix a text starts with."""
+
+    def __init__(self, prefixes):
+        """prefixes is a list of (prefix, rank) pairs; a lower rank is a better match."""
+        self.root = {}
+        for prefix, rank in prefixes:
+            node = self.root
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[None] = min(node.get(None, NO_MATCH), rank)  # None marks the end of a prefix
+
+    def search(self, text):
+        """Return the best rank among the prefixes of text, or NO_MATCH."""
+        node = self.root
+        found = node.get(None, NO_MATCH)
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            rank = node.get(None, NO_MATCH)
+            if rank < found:
+                found = rank
+        return found
+
+class Categorizer:
+    """Maps transaction descriptions to (category, item, super_category).
+
+    Rules are compiled into matchers that each look at a description once: an
+    Aho-Corasick automaton for keywords, a trie for prefixes and regexes. A
+    regex with a literal part is only run when the automaton finds that
+    literal; the others are joined into one alternation, except those that
+    cannot be embedded in one (inline global flags, numbered backreferences),
+    which are run on their own. Every rule has a rank
+    (priority, then insertion order) and the best-ranked match wins. If no rule matches, the
+    target most often assigned to the same merchant signature before is used.
+
+    Those assignments are learned from the budget's ledger, so moving an
+    imported transaction to another item teaches the fallback. Transactions
+    the fallback placed itself are counted in guessed and do not vote until
+    the user moves them.
+    """
+
+    # Distinct descriptions remembered between calls
+    CACHE_SIZE = 100000
+
+    def __init__(self, rules=(), learned=None, guessed=None):
+        self.rules = list(rules)
+        self.learned = {} if learned is None else learned  # signature -> {target: times assigned}
+        self.guessed = {} if guessed is None else guessed  # signature -> {target: times the fallback placed it}
+        self._compiled = None
+        self._cache = {}
+
+    def learn(self, assignments):
+        """Relearn the fallback from (description, category, item, super_category) assignments.
+
+        Pass every transaction in the ledger, e.g. BudgetStore.assignments().
+        Rule hits and uncategorized transactions say nothing new and are skipped.
+        """
+        votes = {}
+        for description, category, item, super_category in assignments:
+            target = (category, item, super_category)
+            if target == UNCATEGORIZED:
+                continue
+            placed, learned = self.match(description)
+            if placed is not None and not learned:
+                continue
+            counts = votes.setdefault(signature(description), {})
+            counts[target] = counts.get(target, 0) + 1
+        self.learned = {}
+        for key, counts in votes.items():
+            guessed = self.guessed.get(key, {})
+            kept = {target: count - guessed.get(target, 0) for target, count in counts.items()
+                    if count > guessed.get(target, 0)}
+            if kept:
+                self.learned[key] = kept
+        self._cache.clear()
+
+    def placed(self, description, category, item, super_category="NEEDS"):
+        """Note where an import put a transaction, so the fallback's own guesses are not learned back."""
+        target, learned = self.match(description)
+        if learned and target == (category, item, super_category):
+            guessed = self.guessed.setdefault(signature(description), {})
+            guessed[target] = guessed.get(target, 0) + 1
+
+    def categorize(self, description, amount=None):
+        """Return (category, item, super_category) for a description, or None if nothing matches.
+
+        The signature matches data.importer's categorize hook; amount is not used.
+        """
+        return self.match(description)[0]
+
+    def match(self, description):
+        """Return (target, learned): categorize()'s answer and whether it came from the learned fallback."""
+        text = normalize(description)
+        cache = self._cache
+        if text in cache:
+            return cache[text]
+        if self._compiled is None:
+            self._compile()
+        keywords, prefixes, gated, combined, separate, ranked = self._compiled
+        rank, triggered = keywords.search(text)
+        prefix_rank = prefixes.search(text)
+        if prefix_rank < rank:
+            rank = prefix_rank
+        if triggered:
+            # Only regexes whose literal part is in the text can match; try them best first
+            for candidate in sorted(triggered):
+                if candidate >= rank:
+                    break
+                if gated[candidate].search(text):
+                    rank = candidate
+                    break
+        if combined is not None:
+            rank = min(rank, self._search_combined(combined, text))
+        for candidate, pattern in separate:
+            if candidate >= rank:
+                break
+            if pattern.search(text):
+                rank = candidate
+                break
+        if rank != NO_MATCH:
+            found = (ranked[rank].target(), False)
+        else:
+            votes = self.learned.get(signature(text))
+            found = (max(votes, key=votes.get), True) if votes else (None, False)
+        if len(cache) >= self.CACHE_SIZE:
+            cache.clear()
+        cache[text] = found
+        return found
+
+    def categorize_many(self, descriptions):
+        """Return the categorize() result for each description."""
+        categorize = self.categorize
+        return [categorize(description) for description in descriptions]
+
+    def _compile(self):
+        # Rank every rule once; matchers then only compare integers
+        order = sorted(range(len(self.rules)), key=lambda index: (-self.rules[index].priority, index))
+        ranked = [self.rules[index] for index in order]
+        keywords = [(normalize(rule.pattern), rank) for rank, rule in enumerate(ranked) if rule.kind == KEYWORD]
+        prefixes = [(normalize(rule.pattern), rank) for rank, rule in enumerate(ranked) if rule.kind == PREFIX]
+        # Regexes with a literal part are gated by the automaton; the rest share one alternation
+        triggers = []
+        gated = {}
+        ungated = []
+        separate = []  # (rank, compiled regex) of patterns that must be searched on their own, best first
+        for rank, rule in enumerate(ranked):
+            if rule.kind != REGEX:
+                continue
+            literal = literal_prefix(rule.pattern)
+            if literal:
+                triggers.append((literal, rank))
+                gated[rank] = re.compile(rule.pattern, re.IGNORECASE)
+                continue
+            # Each alternative is wrapped in a named group so lastgroup tells which rule matched
+            wrapped = f"(?P<_rule{rank}>{rule.pattern})"
+            try:
+                re.compile(wrapped)
+            except re.error:
+                wrapped = None  # e.g. an inline flag such as (?i), which must start the whole pattern
+            if wrapped is None or NUMBERED_REFERENCE.search(rule.pattern):
+                separate.append((rank, re.compile(rule.pattern, re.IGNORECASE)))
+            else:
+                ungated.append((rank, wrapped))
+        combined = None
+        if ungated:
+            try:
+                combined = re.compile("|".join(wrapped for _, wrapped in ungated), re.IGNORECASE)
+            except re.error:
+                # Alternatives that clash, such as two rules naming a group alike, are searched one by one
+                separate = sorted(separate + [(rank, re.compile(ranked[rank].pattern, re.IGNORECASE))
+                                              for rank, _ in ungated])
+        self._compiled = (KeywordAutomaton(keywords, triggers), PrefixTrie(prefixes), gated, combined, separate, ranked)
+
+    def _search_combined(self, combined, text):
+        """Return the best rank among the combined regex's matches at every position of text."""
+        found = NO_MATCH
+        position = 0
+        while True:
+            match = combined.search(text, position)
+            if match is None:
+                return found
+            # At any one position the alternation prefers earlier, better-ranked alternatives
+            found = min(found, int(match.lastgroup[5:]))
+            position = match.start() + 1
+
+    def to_json(self):
+        return {
+            "rules": [rule.to_json() for rule in self.rules],
+            "learned": _votes_to_json(self.learned),
+            "guessed": _votes_to_json(self.guessed),
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls([Rule.from_json(rule) for rule in data.get("rules", [])],
+                   _votes_from_json(data.get("learned", {})), _votes_from_json(data.get("guessed", {})))
+
+    @classmethod
+    def load(cls, path):
+        """Load rules from a JSON file, or start empty if it does not exist."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r") as file:
+            return cls.from_json(json.load(file))
+
+    def save(self, path):
+        write_atomic(path, json.dumps(self.to_json(), indent=4))
+
+def _votes_to_json(votes):
+    return {key: [list(target) + [count] for target, count in counts.items()] for key, counts in votes.items()}
+
+def _votes_from_json(data):
+    return {key: {tuple(entry[:3]): entry[3] for entry in counts} for key, counts in data.items()}
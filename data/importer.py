@@ -0,0 +1,259 @@
+import csv
+import os
+import re
+from contextlib import nullcontext
+from datetime import date, datetime
+from functools import lru_cache
+
+from data.model import MONTHS, month_key, split_key
+
+# Where transactions land when the categorizer does not place them
+UNCATEGORIZED = ("Uncategorized", "Bank Import", "NEEDS")
+
+# How often, in rows, the progress callback is called
+PROGRESS_INTERVAL = 1000
+
+# Column names recognised in CSV headers, compared lower-cased
+DATE_COLUMNS = ("date", "transaction date", "posted date", "posting date", "booking date", "value date")
+AMOUNT_COLUMNS = ("amount", "transaction amount", "amount (usd)")
+DEBIT_COLUMNS = ("debit", "withdrawal", "withdrawals", "money out", "paid out")
+CREDIT_COLUMNS = ("credit", "deposit", "deposits", "money in", "paid in")
+DESCRIPTION_COLUMNS = ("description", "payee", "name", "merchant", "details", "memo", "narrative")
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%m/%d/%y", "%d.%m.%Y", "%Y/%m/%d", "%d-%m-%Y", "%d %b %Y", "%b %d, %Y")
+
+# An OFX element, opening or closing, with the text that follows it up to the next tag
+OFX_TOKEN = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+class StatementError(ValueError):
+    """Raised when a statement file cannot be read as CSV or OFX."""
+
+class ImportSummary:
+    """What an import did, or would do in a dry run."""
+
+    def __init__(self, path, dry_run):
+        self.path = path
+        self.dry_run = dry_run
+        self.rows = 0  # Transactions read from the file
+        self.imported = 0  # Transactions added to an expense item
+        self.credits = 0  # Deposits and refunds, which are not expenses
+        self.unreadable = 0  # Rows whose date or amount could not be parsed
+        self.uncategorized = 0  # Transactions that fell through to UNCATEGORIZED
+        self.first_date = None
+        self.last_date = None
+        self.totals = {}  # (month key, category, item, super_category) -> summed cost
+
+    def month_totals(self):
+        """Return {(month, year): cost} for the imported transactions, in time order."""
+        totals = {}
+        for (key, _, _, _), amount in sorted(self.totals.items()):
+            period = split_key(key)
+            totals[period] = totals.get(period, 0) + amount
+        return totals
+
+    def category_totals(self):
+        """Return {category: cost} for the imported transactions."""
+        totals = {}
+        for (_, category, _, _), amount in self.totals.items():
+            totals[category] = totals.get(category, 0) + amount
+        return totals
+
+    def describe(self):
+        """Return a short human-readable report."""
+        lines = [f"{'Would import' if self.dry_run else 'Imported'} {self.imported} of {self.rows} transactions"]
+        if self.first_date is not None:
+            lines.append(f"Dates: {self.first_date.isoformat()} to {self.last_date.isoformat()}")
+        lines.append(f"Skipped: {self.credits} credits, {self.unreadable} unreadable rows")
+        if self.uncategorized:
+            lines.append(f"Uncategorized: {self.uncategorized}")
+        for (month, year), amount in self.month_totals().items():
+            lines.append(f"  {month} {year}: {amount:.2f}")
+        return "\n".join(lines)
+
+@lru_cache(maxsize=4096)  # Statements repeat the same few hundred dates
+def parse_date(text):
+    """Parse a statement date, including OFX's YYYYMMDD[HHMMSS[.XXX][TZ]] form."""
+    text = text.strip()
+    if len(text) >= 8 and text[:8].isdigit():
+        return date(int(text[:4]), int(text[4:6]), int(text[6:8]))
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {text!r}")
+
+def parse_amount(text):
+    """Parse an amount such as "-1,234.50", "$12.00" or "(45.10)"."""
+    text = text.strip().replace(",", "").replace("$", "").replace("£", "").replace("€", "")
+    negative = text.startswith("(") and text.endswith(")")
+    if negative:
+        text = text[1:-1]
+    if not text:
+        return 0.0
+    amount = float(text)
+    return -amount if negative else amount
+
+def read_transactions(path, progress=None):
+    """Yield (date, amount, description) for each transaction in a CSV or OFX/QFX file.
+
+    Rows that cannot be parsed are yielded as None so they can be counted. The
+    file is read incrementally; memory use does not grow with its size.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    reader = read_ofx if extension in (".ofx", ".qfx") else read_csv
+    return reader(path, progress)
+
+def read_csv(path, progress=None):
+    """Yield (date, amount, description) for each row of a bank CSV export."""
+    total_size = os.path.getsize(path)
+    consumed = [0]
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as file:
+        rows = csv.reader(_counted(file, consumed))
+        header = [name.strip().lower() for name in next(rows, [])]
+        date_column = _find_column(header, DATE_COLUMNS)
+        description_column = _find_column(header, DESCRIPTION_COLUMNS)
+        amount_column = _find_column(header, AMOUNT_COLUMNS)
+        debit_column = _find_column(header, DEBIT_COLUMNS)
+        credit_column = _find_column(header, CREDIT_COLUMNS)
+        if date_column is None or (amount_column is None and debit_column is None):
+            raise StatementError(f"{path}: no date and amount columns in the CSV header")
+        count = 0
+        for row in rows:
+            if not row:
+                continue
+            count += 1
+            try:
+                if amount_column is not None:
+                    amount = parse_amount(row[amount_column])
+                else:
+                    amount = -parse_amount(row[debit_column])
+                    if credit_column is not None:
+                        amount += parse_amount(row[credit_column])
+                description = row[description_column].strip() if description_column is not None else ""
+                yield parse_date(row[date_column]), amount, description
+            except (ValueError, IndexError):
+                yield None
+            if progress is not None and count % PROGRESS_INTERVAL == 0:
+                progress(count, consumed[0], total_size)
+        if progress is not None:
+            progress(count, total_size, total_size)
+
+def read_ofx(path, progress=None):
+    """Yield (date, amount, description) for each <STMTTRN> in an OFX or QFX file.
+
+    Handles both the SGML flavour (unclosed leaf elements, one per line) and
+    XML, including files with no line breaks at all.
+    """
+    total_size = os.path.getsize(path)
+    consumed = 0
+    count = 0
+    transaction = None
+    with open(path, encoding="utf-8", errors="replace") as file:
+        for chunk in _ofx_chunks(file):
+            consumed += len(chunk)
+            for closing, tag, text in OFX_TOKEN.findall(chunk):
+                tag = tag.upper()
+                if tag == "STMTTRN":
+                    if not closing:
+                        transaction = {}
+                        continue
+                    if transaction is not None:
+                        count += 1
+                        try:
+                            description = transaction.get("NAME") or transaction.get("MEMO") or transaction.get("PAYEE", "")
+                            yield parse_date(transaction["DTPOSTED"]), parse_amount(transaction["TRNAMT"]), description
+                        except (KeyError, ValueError):
+                            yield None
+                        if progress is not None and count % PROGRESS_INTERVAL == 0:
+                            progress(count, consumed, total_size)
+                    transaction = None
+                elif transaction is not None and not closing:
+                    transaction[tag] = text.strip()
+    if progress is not None:
+        progress(count, total_size, total_size)
+
+def import_file(budget_data, path, categorize=None, dry_run=False, include_credits=False, progress=None, placed=None):
+    """Add the expenses in a bank statement to the matching months, categories and items.
+
+    categorize(description, amount) returns (category, item, super_category)
+    or None, in which case the transaction goes to UNCATEGORIZED. Each debit
+    is added to its month's transaction ledger, which also adds it to the
+    item's actual cost as it is read; the whole file goes in as a single
+    BudgetData batch, so it is one journal write and one change notification,
+    and an error or a cancel part way through leaves the budget as it was.
+    Memory does not grow with the size of the file. With dry_run nothing
+    is changed and the summary says what would happen. progress(rows,
+    bytes_read, total_bytes) is called as the file is read. Unless dry_run is
+    set, placed(description, category, item, super_category) is called for each
+    debit categorize placed, e.g. data.categorizer.Categorizer.placed.
+    """
+    summary = ImportSummary(path, dry_run)
+    totals = summary.totals
+    with nullcontext() if dry_run else budget_data.batch("Import statement"):
+        for transaction in read_transactions(path, progress):
+            summary.rows += 1
+            if transaction is None:
+                summary.unreadable += 1
+                continue
+            when, amount, description = transaction
+            if amount >= 0 and not include_credits:
+                summary.credits += 1
+                continue
+            target = categorize(description, amount) if categorize is not None else None
+            if target is None:
+                target = UNCATEGORIZED
+                summary.uncategorized += 1
+            elif placed is not None and not dry_run:
+                placed(description, *target)
+            category, item, super_category = target
+            key = month_key(MONTHS[when.month - 1], when.year)
+            target_key = (key, category, item, super_category)
+            totals[target_key] = totals.get(target_key, 0) - amount  # Debits are negative; costs are positive
+            if not dry_run:
+                add_to_ledger(budget_data, key, category, item, super_category, when, -amount, description)
+            summary.imported += 1
+            if summary.first_date is None or when < summary.first_date:
+                summary.first_date = when
+            if summary.last_date is None or when > summary.last_date:
+                summary.last_date = when
+    return summary
+
+def add_to_ledger(budget_data, key, category, item, super_category, when, amount, description):
+    """Add a cost to a month's ledger, creating its category and expense item first if they do not exist yet."""
+    month, year = split_key(key)
+    categories = budget_data.get_data(month, year).categories
+    if category not in categories:
+        budget_data.add_category(month, year, category, super_category)
+        categories = budget_data.get_data(month, year).categories
+    if item not in categories[category].expenses:
+        budget_data.add_expense(month, year, category, item)
+    budget_data.add_transaction(month, year, category, item, when, amount, description)
+
+def _find_column(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+def _counted(lines, consumed):
+    """Pass lines through, adding their length to consumed[0] for progress reporting."""
+    for line in lines:
+        consumed[0] += len(line)
+        yield line
+
+def _ofx_chunks(file, size=1 << 16):
+    """Yield pieces of an OFX file that never split a tag or its text."""
+    pending = ""
+    while True:
+        block = file.read(size)
+        if not block:
+            if pending:
+                yield pending
+            return
+        pending += block
+        cut = pending.rfind("<")
+        if cut <= 0:
+            continue
+        yield pending[:cut]
+        pending = pending[cut:]
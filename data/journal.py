@@ -0,0 +1,44 @@
+import json
+import os
+
+class Journal:
+    """Append-only log of budget mutations kept next to the JSON snapshot."""
+
+    def __init__(self, path):
+        self.path = path
+        self.record_count = 0  # Records written since the last compaction
+
+    def extend(self, records):
+        """Append mutation records with a single write and return the number of bytes written.
+
+        Several records are stored together as one JSON array line, so a crash
+        mid-write drops the whole group instead of replaying half of it.
+        """
+        line = json.dumps(records[0] if len(records) == 1 else records) + "\n"
+        with open(self.path, 'a') as file:
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+        self.record_count += len(records)
+        return len(line)
+
+    def replay(self):
+        """Yield the records stored in the journal, oldest first."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash mid-append can leave a partial last line behind
+                    break
+                records = record if isinstance(record, list) else [record]
+                self.record_count += len(records)
+                yield from records
+
+    def clear(self):
+        """Discard all records once they have been folded into the snapshot."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.record_count = 0
@@ -0,0 +1,141 @@
+import sys
+from collections import namedtuple
+from types import MappingProxyType
+
+from data.transactions import TransactionLog
+
+MONTHS = ["January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December"]
+MONTH_NUMBERS = {name: number for number, name in enumerate(MONTHS)}
+
+def month_key(month, year):
+    """Return the ordinal key for a month name and year. Keys sort in time order."""
+    return int(year) * 12 + MONTH_NUMBERS[month]
+
+def split_key(key):
+    """Split an ordinal key into its month name and year."""
+    year, month = divmod(key, 12)
+    return MONTHS[month], year
+
+def key_to_label(key):
+    """Return the "Month_Year" label used in the JSON file for an ordinal key."""
+    month, year = split_key(key)
+    return f"{month}_{year}"
+
+def label_to_key(label):
+    """Parse a "Month_Year" label back into an ordinal key."""
+    month, year = label.rsplit("_", 1)
+    return month_key(month, year)
+
+class ExpenseItem:
+    """Projected and actual cost of one expense item."""
+
+    __slots__ = ("projected", "actual")
+
+    def __init__(self, projected=0, actual=0):
+        self.projected = projected
+        self.actual = actual
+
+    def copy(self):
+        return ExpenseItem(self.projected, self.actual)
+
+class Category:
+    """A category's super category and its expense items, keyed by interned name."""
+
+    __slots__ = ("super_category", "expenses")
+
+    def __init__(self, super_category, expenses=None):
+        self.super_category = sys.intern(super_category)
+        self.expenses = {} if expenses is None else expenses
+
+    def copy(self):
+        return Category(self.super_category, {name: item.copy() for name, item in self.expenses.items()})
+
+    def totals(self):
+        """Return the summed (projected, actual) of the expense items."""
+        projected = 0
+        actual = 0
+        for item in self.expenses.values():
+            projected += item.projected
+            actual += item.actual
+        return projected, actual
+
+class Month:
+    """The categories budgeted for one month, keyed by interned name, and its transactions."""
+
+    __slots__ = ("categories", "transactions")
+
+    def __init__(self, categories=None, transactions=None):
+        self.categories = {} if categories is None else categories
+        self.transactions = transactions  # TransactionLog, or None until the first transaction
+
+    def copy(self):
+        transactions = None if self.transactions is None else self.transactions.copy()
+        return Month({name: category.copy() for name, category in self.categories.items()}, transactions)
+
+    def frozen(self):
+        """Return a read-only copy that is safe to share: nothing in it, down to the costs, can be changed."""
+        return FrozenMonth(MappingProxyType({
+            name: FrozenCategory(category.super_category, MappingProxyType({
+                item: FrozenExpenseItem(expense.projected, expense.actual)
+                for item, expense in category.expenses.items()}))
+            for name, category in self.categories.items()
+        }), None)
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+# Immutable counterparts handed out by Month.frozen(); copy() returns the ordinary, mutable kind
+
+class FrozenExpenseItem(namedtuple("FrozenExpenseItem", "projected actual")):
+    __slots__ = ()
+
+    def copy(self):
+        return ExpenseItem(self.projected, self.actual)
+
+class FrozenCategory(namedtuple("FrozenCategory", "super_category expenses")):
+    __slots__ = ()
+
+    totals = Category.totals
+
+    def copy(self):
+        return Category(self.super_category, {name: item.copy() for name, item in self.expenses.items()})
+
+class FrozenMonth(namedtuple("FrozenMonth", "categories transactions")):
+    __slots__ = ()
+
+    copy = Month.copy
+
+def month_from_json(data):
+    """Build a Month from its JSON form."""
+    intern = sys.intern
+    transactions = data.get("transactions")
+    return Month({
+        intern(name): Category(category["super_category"], {
+            intern(item): ExpenseItem(expense["projected"], expense["actual"])
+            for item, expense in category["expenses"].items()
+        })
+        for name, category in data["categories"].items()
+    }, None if transactions is None else TransactionLog.from_json(transactions))
+
+def month_to_json(month):
+    """Return the JSON form of a Month."""
+    data = {"categories": {
+        name: {
+            "super_category": category.super_category,
+            "expenses": {item: {"projected": expense.projected, "actual": expense.actual}
+                         for item, expense in category.expenses.items()},
+        }
+        for name, category in month.categories.items()
+    }}
+    if month.transactions is not None:
+        data["transactions"] = month.transactions.to_json()
+    return data
+
+def budget_from_json(data):
+    """Convert the JSON file's {"Month_Year": month} mapping to {ordinal key: Month}."""
+    return {label_to_key(label): month_from_json(month) for label, month in data.items()}
+
+def budget_to_json(months):
+    """Convert {ordinal key: Month} back to the JSON file's layout, in time order."""
+    return {key_to_label(key): month_to_json(months[key]) for key in sorted(months)}
@@ -0,0 +1,186 @@
+import os
+import tempfile
+import threading
+import time
+
+from utils.instrumentation import count, timed
+
+def write_atomic(path, text):
+    """Write text (or bytes) to path via a temporary file, fsync and rename so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(text, bytes) else 'w') as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return len(text)
+
+class PersistenceWorker(threading.Thread):
+    """Background thread that hands committed records to the storage backend off the GUI thread.
+
+    Bursts of commits are debounced: the worker waits until no new records have
+    arrived for `delay` seconds (but never longer than `max_delay`) and then
+    writes everything pending with one storage write. A failed write is kept
+    and retried after a delay that doubles with each failure in a row, from
+    `retry_delay` up to `max_retry_delay`.
+    """
+
+    def __init__(self, storage, owner, delay=0.3, max_delay=2.0, retry_delay=0.5, max_retry_delay=30.0):
+        super().__init__(name="BudgetPersistence", daemon=True)
+        self.storage = storage
+        self.owner = owner  # BudgetStore whose lock guards the data the storage serializes
+        self.delay = delay
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.stats = {
+            "writes": 0,
+            "records_written": 0,
+            "snapshots_written": 0,
+            "bytes_written": 0,
+            "last_write_ms": 0.0,
+            "max_write_ms": 0.0,
+            "total_write_ms": 0.0,
+            "last_latency_ms": 0.0,  # Time from the oldest pending commit until it reached the disk
+            "errors": 0,
+        }
+        self._condition = threading.Condition()
+        self._pending = []
+        self._snapshot_requested = False
+        self._first_pending_at = None
+        self._last_pending_at = None
+        self._flushing = 0
+        self._busy = False
+        self._stopping = False
+        self._failures = 0  # Failed writes in a row
+        self._retry_at = None  # time.monotonic() before which a failed write is not retried
+
+    def submit(self, records):
+        """Queue committed records for the journal."""
+        with self._condition:
+            self._touch()
+            self._pending.extend(records)
+            self._condition.notify_all()
+
+    def request_snapshot(self):
+        """Ask the worker to compact the storage, e.g. fold the journal into a fresh snapshot."""
+        with self._condition:
+            self._touch()
+            self._snapshot_requested = True
+            self._condition.notify_all()
+
+    def flush(self):
+        """Block until queued records and snapshots are on disk.
+
+        Pending work is written at once, even during a retry delay. Return
+        False as soon as that attempt fails.
+        """
+        with self._condition:
+            errors = self.stats["errors"]
+            self._flushing += 1
+            self._retry_at = None
+            self._condition.notify_all()
+            try:
+                while (self._has_work() or self._busy) and self.stats["errors"] == errors:
+                    self._condition.wait()
+            finally:
+                self._flushing -= 1
+            return self.stats["errors"] == errors
+
+    def stop(self):
+        """Flush outstanding work and end the thread. Return False if it could not all be written.
+
+        After a failed final attempt the thread ends anyway; the unwritten work is dropped.
+        """
+        flushed = self.flush()
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self.join()
+        return flushed
+
+    def run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopping and (not self._has_work() or self._failures):
+                        return
+                    if self._has_work() and self._retry_at is None:
+                        break
+                    if self._retry_at is None:
+                        self._condition.wait()
+                        continue
+                    remaining = self._retry_at - time.monotonic()
+                    if remaining <= 0:
+                        self._retry_at = None
+                        break
+                    self._condition.wait(remaining)
+                self._wait_for_quiet()
+                records, self._pending = self._pending, []
+                snapshot, self._snapshot_requested = self._snapshot_requested, False
+                started_at, self._first_pending_at = self._first_pending_at, None
+                self._busy = True
+            try:
+                self._write(records, snapshot, started_at)
+                with self._condition:
+                    self._failures = 0
+            except Exception:
+                # Put the work back so a later round retries it, after a growing delay
+                with self._condition:
+                    self.stats["errors"] += 1
+                    self._failures += 1
+                    self._retry_at = time.monotonic() + min(self.retry_delay * 2 ** (self._failures - 1),
+                                                            self.max_retry_delay)
+                    self._pending[:0] = records
+                    self._snapshot_requested = self._snapshot_requested or snapshot
+                    self._touch()
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _touch(self):
+        now = time.monotonic()
+        if self._first_pending_at is None:
+            self._first_pending_at = now
+        self._last_pending_at = now
+
+    def _has_work(self):
+        return bool(self._pending) or self._snapshot_requested
+
+    def _wait_for_quiet(self):
+        """Wait, holding the condition, until commits stop arriving or max_delay is reached."""
+        while not self._flushing and not self._stopping:
+            deadline = min(self._last_pending_at + self.delay, self._first_pending_at + self.max_delay)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self._condition.wait(remaining)
+
+    @timed()
+    def _write(self, records, snapshot, started_at):
+        start = time.perf_counter()
+        if records:
+            size = self.storage.write(records, self.owner)
+            self.stats["bytes_written"] += size
+            self.stats["writes"] += 1
+            self.stats["records_written"] += len(records)
+            count("persistence.bytes_written", size)
+            count("persistence.records_written", len(records))
+        if snapshot or self.storage.needs_compaction():
+            size = self.storage.compact(self.owner)
+            self.stats["bytes_written"] += size
+            self.stats["snapshots_written"] += 1
+            count("persistence.bytes_written", size)
+            count("persistence.snapshots_written")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats["last_write_ms"] = elapsed_ms
+        self.stats["max_write_ms"] = max(self.stats["max_write_ms"], elapsed_ms)
+        self.stats["total_write_ms"] += elapsed_ms
+        self.stats["last_latency_ms"] = (time.monotonic() - started_at) * 1000
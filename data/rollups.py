@@ -0,0 +1,109 @@
+from math import fsum
+
+from data.model import MONTHS
+
+# Resolutions above a single month, with the number of months in each bucket.
+# Month keys are year * 12 + month, so a month's bucket is key // span.
+QUARTER = "quarter"
+YEAR = "year"
+DECADE = "decade"
+SPANS = {QUARTER: 3, YEAR: 12, DECADE: 120}
+
+def bucket_of(resolution, year, month=None):
+    """Return the bucket number that a year (or a month of it) falls in at a resolution."""
+    key = int(year) * 12 + (MONTHS.index(month) if month is not None else 0)
+    return key // SPANS[resolution]
+
+def bucket_label(resolution, bucket):
+    """Return a display label such as "Q3 2025", "2025" or "2020s" for a bucket."""
+    if resolution == QUARTER:
+        year, quarter = divmod(bucket, 4)
+        return f"Q{quarter + 1} {year}"
+    if resolution == YEAR:
+        return str(bucket)
+    return f"{bucket * 10}s"
+
+class RollupIndex:
+    """Projected and actual totals per quarter, year and decade.
+
+    The pyramid is fed the same deltas as AggregateIndex, so a bucket total is
+    a dictionary lookup, and a range of buckets costs one lookup per bucket
+    however many expense items lie underneath.
+    """
+
+    def __init__(self):
+        self.categories = {resolution: {} for resolution in SPANS}  # bucket -> {category: [projected, actual]}
+        self.super_categories = {resolution: {} for resolution in SPANS}  # bucket -> {super_category: [projected, actual]}
+        self.totals = {resolution: {} for resolution in SPANS}  # bucket -> [projected, actual]
+
+    def clear(self):
+        for levels in (self.categories, self.super_categories, self.totals):
+            for buckets in levels.values():
+                buckets.clear()
+
+    def add(self, key, category, super_category, projected, actual):
+        """Apply a month's projected/actual delta to every bucket above it."""
+        for resolution, span in SPANS.items():
+            bucket = key // span
+            self._bump(self.categories[resolution].setdefault(bucket, {}), category, projected, actual)
+            self._bump(self.super_categories[resolution].setdefault(bucket, {}), super_category, projected, actual)
+            self._bump(self.totals[resolution], bucket, projected, actual)
+
+    def drop_month(self, key, categories, super_categories, total):
+        """Take a month's {category: totals}, {super_category: totals} and overall total out of its buckets."""
+        for resolution, span in SPANS.items():
+            bucket = key // span
+            bucket_categories = self.categories[resolution].setdefault(bucket, {})
+            for category, (projected, actual) in categories.items():
+                self._bump(bucket_categories, category, -projected, -actual)
+            bucket_super_categories = self.super_categories[resolution].setdefault(bucket, {})
+            for super_category, (projected, actual) in super_categories.items():
+                self._bump(bucket_super_categories, super_category, -projected, -actual)
+            if total is not None:
+                self._bump(self.totals[resolution], bucket, -total[0], -total[1])
+
+    def reindex(self, keys, categories, super_categories, totals):
+        """Sum the buckets holding some months afresh from AggregateIndex's per-month totals.
+
+        categories, super_categories and totals are its {key: ...} dictionaries.
+        """
+        for resolution, span in SPANS.items():
+            for bucket in {key // span for key in keys}:
+                members = [key for key in range(bucket * span, (bucket + 1) * span) if key in totals]
+                if not members:
+                    continue
+                self.categories[resolution][bucket] = _sum_totals(categories.get(key, {}) for key in members)
+                self.super_categories[resolution][bucket] = _sum_totals(super_categories.get(key, {}) for key in members)
+                self.totals[resolution][bucket] = [fsum(totals[key][0] for key in members),
+                                                   fsum(totals[key][1] for key in members)]
+
+    def total(self, resolution, bucket, category=None, super_category=None):
+        """Return (projected, actual) for one bucket, or None if nothing was ever budgeted in it."""
+        if category is not None:
+            total = self.categories[resolution].get(bucket, {}).get(category)
+        elif super_category is not None:
+            total = self.super_categories[resolution].get(bucket, {}).get(super_category)
+        else:
+            total = self.totals[resolution].get(bucket)
+        return None if total is None else tuple(total)
+
+    def range(self, resolution, first, last, category=None, super_category=None):
+        """Return the total of every bucket from first to last inclusive, as total() would."""
+        return [self.total(resolution, bucket, category, super_category) for bucket in range(first, last + 1)]
+
+    def _bump(self, totals, index_key, projected, actual):
+        total = totals.get(index_key)
+        if total is None:
+            totals[index_key] = [projected, actual]
+        else:
+            total[0] += projected
+            total[1] += actual
+
+def _sum_totals(months):
+    """Add up {name: [projected, actual]} dictionaries exactly."""
+    grouped = {}
+    for month in months:
+        for name, total in month.items():
+            grouped.setdefault(name, []).append(total)
+    return {name: [fsum(total[0] for total in totals), fsum(total[1] for total in totals)]
+            for name, totals in grouped.items()}
@@ -0,0 +1,234 @@
+import gc
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from data.model import Category, ExpenseItem, Month
+from data.persistence import write_atomic
+from data.transactions import TransactionLog
+
+# Binary budget snapshot, all little-endian:
+#
+#   header        magic, version, flags, counts, string bytes, payload size, CRC-32 of the payload
+#   strings       u32 byte length of each string, then the UTF-8 bytes of all of them
+#   months        i64 key, u32 category count, u32 transaction count, i64 next transaction id
+#   categories    u32 name, u32 super category (indexes into the strings), u32 item count
+#   items         u32 name, f64 projected, f64 actual
+#   transactions  i64 id, i64 date ordinal, f64 amount, u32 category, u32 item, u32 description
+#
+# Every column is a packed array padded to 8 bytes, so it can be read straight out of the map.
+MAGIC = b"FBSNAP"
+VERSION = 1
+HEADER = struct.Struct("<6sHHIIIIIQQI")
+
+class SnapshotError(ValueError):
+    """Raised when a binary snapshot is truncated, corrupt or from an unknown version."""
+
+def encode_budget(months):
+    """Return the binary snapshot of {key: Month} as bytes."""
+    codes = {}
+    strings = []
+
+    def code(text):
+        index = codes.get(text)
+        if index is None:
+            index = codes[text] = len(strings)
+            strings.append(text)
+        return index
+
+    month_keys = array("q")
+    category_counts = array("I")
+    transaction_counts = array("I")
+    next_ids = array("q")
+    category_names = []
+    super_categories = []
+    item_counts = []
+    item_names = []
+    projected = array("d")
+    actual = array("d")
+    transaction_ids = array("q")
+    transaction_days = array("q")
+    transaction_amounts = array("d")
+    transaction_categories = []
+    transaction_items = []
+    transaction_descriptions = []
+    for key in sorted(months):
+        month_data = months[key]
+        month_keys.append(key)
+        category_counts.append(len(month_data.categories))
+        for category, data in month_data.categories.items():
+            category_names.append(code(category))
+            super_categories.append(code(data.super_category))
+            item_counts.append(len(data.expenses))
+            for item, expense in data.expenses.items():
+                item_names.append(code(item))
+                projected.append(expense.projected)
+                actual.append(expense.actual)
+        transactions = month_data.transactions
+        if transactions is None:
+            transaction_counts.append(0)
+            next_ids.append(0)
+            continue
+        transaction_counts.append(len(transactions))
+        next_ids.append(transactions.next_id)
+        targets = [(code(category), code(item)) for category, item in transactions.target_names]
+        transaction_ids.extend(transactions.ids)
+        transaction_days.extend(array("q", transactions.days))  # "l" is 32 bits on Windows
+        transaction_amounts.extend(transactions.amounts)
+        for target in transactions.targets:
+            category_code, item_code = targets[target]
+            transaction_categories.append(category_code)
+            transaction_items.append(item_code)
+        transaction_descriptions.extend(code(description) for description in transactions.descriptions)
+
+    encoded = [text.encode("utf-8") for text in strings]
+    string_bytes = b"".join(encoded)
+    sections = [
+        array("I", [len(text) for text in encoded]), string_bytes,
+        month_keys, category_counts, transaction_counts, next_ids,
+        array("I", category_names), array("I", super_categories), array("I", item_counts),
+        array("I", item_names), projected, actual,
+        transaction_ids, transaction_days, transaction_amounts,
+        array("I", transaction_categories), array("I", transaction_items), array("I", transaction_descriptions),
+    ]
+    payload = bytearray()
+    for section in sections:
+        if isinstance(section, array) and sys.byteorder == "big":
+            section = array(section.typecode, section)
+            section.byteswap()
+        payload += section if isinstance(section, bytes) else section.tobytes()
+        payload += bytes(-len(payload) % 8)
+    header = HEADER.pack(MAGIC, VERSION, 0, len(strings), len(month_keys), len(category_names), len(item_names),
+                         len(transaction_ids), len(string_bytes), len(payload), zlib.crc32(payload))
+    return header + payload
+
+def decode_budget(buffer):
+    """Return {key: Month} from a binary snapshot held in any buffer, validating it first.
+
+    Raises SnapshotError if the header, checksum or any count or string
+    reference is inconsistent, so a damaged file is never half-loaded.
+    """
+    # Views into a memory map must be released before it can be closed, even when decoding fails
+    with memoryview(buffer) as view, view[HEADER.size:] as payload:
+        # Nothing built here can form a cycle, so pause the cyclic collector: it would
+        # otherwise rescan the growing budget over and over and take most of the time
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            return _decode(view, payload)
+        finally:
+            if collecting:
+                gc.enable()
+
+def _decode(view, payload):
+    if len(view) < HEADER.size:
+        raise SnapshotError("File is too short to be a budget snapshot")
+    (magic, version, _, string_count, month_count, category_count, item_count, transaction_count,
+     string_size, payload_size, checksum) = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise SnapshotError("Not a budget snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+    if len(payload) != payload_size:
+        raise SnapshotError(f"Snapshot is truncated: expected {payload_size} bytes of data, found {len(payload)}")
+    if zlib.crc32(payload) != checksum:
+        raise SnapshotError("Snapshot checksum does not match; the file is corrupt")
+
+    offset = 0
+
+    def column(typecode, count):
+        nonlocal offset
+        values = array(typecode)
+        size = values.itemsize * count
+        if offset + size > payload_size:
+            raise SnapshotError("Snapshot sections overrun the data")
+        values.frombytes(payload[offset:offset + size])
+        if sys.byteorder == "big":
+            values.byteswap()
+        offset += size + (-size % 8)
+        return values
+
+    lengths = column("I", string_count)
+    if sum(lengths) != string_size or offset + string_size > payload_size:
+        raise SnapshotError("String table sizes do not add up")
+    strings = []
+    position = offset
+    for length in lengths:
+        strings.append(sys.intern(str(payload[position:position + length], "utf-8")))
+        position += length
+    offset += string_size + (-string_size % 8)
+
+    month_keys = column("q", month_count)
+    category_counts = column("I", month_count)
+    transaction_counts = column("I", month_count)
+    next_ids = column("q", month_count)
+    category_names = column("I", category_count)
+    super_categories = column("I", category_count)
+    item_counts = column("I", category_count)
+    item_names = column("I", item_count)
+    projected = column("d", item_count).tolist()
+    actual = column("d", item_count).tolist()
+    transaction_ids = column("q", transaction_count)
+    transaction_days = column("q", transaction_count)
+    transaction_amounts = column("d", transaction_count)
+    transaction_categories = column("I", transaction_count)
+    transaction_items = column("I", transaction_count)
+    transaction_descriptions = column("I", transaction_count)
+    if (sum(category_counts) != category_count or sum(item_counts) != item_count
+            or sum(transaction_counts) != transaction_count):
+        raise SnapshotError("Snapshot counts do not add up")
+    for references in (category_names, super_categories, item_names, transaction_categories, transaction_items,
+                       transaction_descriptions):
+        if references and max(references) >= string_count:
+            raise SnapshotError("Snapshot refers to a string that is not in its table")
+    if len(set(month_keys)) != month_count:
+        raise SnapshotError("Snapshot has a month more than once")
+
+    months = {}
+    category_index = 0
+    item_index = 0
+    transaction_index = 0
+    names = [strings[index] for index in item_names]
+    for month_index, key in enumerate(month_keys):
+        categories = {}
+        for _ in range(category_counts[month_index]):
+            last = item_index + item_counts[category_index]
+            categories[strings[category_names[category_index]]] = Category(
+                strings[super_categories[category_index]],
+                dict(zip(names[item_index:last], map(ExpenseItem, projected[item_index:last], actual[item_index:last]))))
+            item_index = last
+            category_index += 1
+        month_data = Month(categories)
+        count = transaction_counts[month_index]
+        if count or next_ids[month_index]:
+            transactions = month_data.transactions = TransactionLog()
+            for position in range(transaction_index, transaction_index + count):
+                code_key = (strings[transaction_categories[position]], strings[transaction_items[position]])
+                code = transactions.target_codes.get(code_key)
+                if code is None:
+                    code = transactions.target_codes[code_key] = len(transactions.target_names)
+                    transactions.target_names.append(code_key)
+                transactions.targets.append(code)
+                transactions.descriptions.append(strings[transaction_descriptions[position]])
+            transactions.ids = transaction_ids[transaction_index:transaction_index + count]
+            transactions.days = array("l", transaction_days[transaction_index:transaction_index + count])
+            transactions.amounts = transaction_amounts[transaction_index:transaction_index + count]
+            transactions.next_id = next_ids[month_index]
+            transaction_index += count
+        months[key] = month_data
+    return months
+
+def read_snapshot(path):
+    """Load {key: Month} from a binary snapshot file through a read-only memory map."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise SnapshotError("Snapshot file is empty")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode_budget(mapped)
+
+def write_snapshot(path, months):
+    """Atomically write {key: Month} as a binary snapshot and return its size."""
+    return write_atomic(path, encode_budget(months))
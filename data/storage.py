@@ -0,0 +1,555 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from data.journal import Journal
+from data.model import Category, ExpenseItem, Month, budget_from_json, budget_to_json, month_key, split_key
+from data.persistence import write_atomic
+from data.snapshot import read_snapshot, write_snapshot
+from data.transactions import TransactionLog
+
+class MonthCache(dict):
+    """Months held in memory, keyed by ordinal (year, month) key.
+
+    Stored months that are not in memory yet are pulled from the storage
+    backend on first access, together with whatever else the backend stores
+    alongside them (a sharded store hands back the whole year). Months that
+    were never stored raise KeyError until materialize() creates them.
+
+    With a lazy backend, at most max_years years are kept in memory: when
+    another is loaded, the least recently used year without unsaved changes
+    is dropped, to be read back from storage if it is needed again.
+    """
+
+    def __init__(self, storage, max_years=None):
+        super().__init__()
+        self.storage = storage
+        self.max_years = max_years
+        self.years = OrderedDict()  # Years in memory, least recently used first
+        self.dirty = {}  # year -> version of its newest change that has not been written yet
+
+    def __missing__(self, key):
+        months = self.storage.load_months(key)
+        for loaded_key, month_data in months.items():
+            if not dict.__contains__(self, loaded_key):
+                self[loaded_key] = month_data
+        if key not in months:
+            raise KeyError(key)
+        self.use(key)
+        return months[key]
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or self.storage.has_month(key)
+
+    def is_loaded(self, key):
+        """Return True if the month is already in memory."""
+        return dict.__contains__(self, key)
+
+    def materialize(self, key, template):
+        """Return the month for writing, creating it as a copy of the template if it is new."""
+        if not dict.__contains__(self, key):
+            try:
+                self[key]  # Loads the month, and its shard, if it is stored
+            except KeyError:
+                # A sharded backend rewrites whole years, so the rest of the year must be in memory first
+                self.load_year(key // 12)
+                self[key] = template.copy()
+                self.use(key)
+        return dict.__getitem__(self, key)
+
+    def load_year(self, year):
+        """Pull every stored month of a year into memory."""
+        for key in range(year * 12, year * 12 + 12):
+            if not dict.__contains__(self, key) and self.storage.has_month(key):
+                self[key]
+
+    def use(self, key):
+        """Mark a month's year as recently used, evicting the coldest clean year if over budget."""
+        year = key // 12
+        years = self.years
+        if year in years:
+            years.move_to_end(year)
+            return
+        years[year] = None
+        if self.max_years is None or not self.storage.lazy:
+            return
+        for cold in list(years):
+            if len(years) <= self.max_years:
+                break
+            if cold != year and cold not in self.dirty:
+                del years[cold]
+                for cold_key in [cold_key for cold_key in dict.keys(self) if cold_key // 12 == cold]:
+                    del self[cold_key]
+
+    def mark_dirty(self, key, version):
+        """Record that a month changed and must stay in memory until it is written."""
+        self.dirty[key // 12] = version
+
+    def mark_clean(self, versions):
+        """Forget the unsaved changes that {year: version} says have now been written."""
+        for year, version in versions.items():
+            if version is not None and self.dirty.get(year) == version:
+                del self.dirty[year]
+
+class JsonStorage:
+    """Whole-file JSON snapshot plus an append-only journal of mutation records."""
+
+    def __init__(self, path, compact_threshold):
+        self.path = path
+        self.journal = Journal(path + ".journal")
+        self.compact_threshold = compact_threshold
+        self.lazy = False  # Everything is loaded up front, so nothing can be evicted
+
+    def load(self):
+        """Return every stored month. The JSON snapshot is always read in full."""
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as file:
+                return budget_from_json(json.load(file))
+        return {}
+
+    def replay(self):
+        """Yield journaled records that are not in the snapshot yet."""
+        return self.journal.replay()
+
+    def has_month(self, key):
+        return False  # Everything was loaded up front
+
+    def load_months(self, key):
+        return {}
+
+    def month_keys(self):
+        return []
+
+    def category_totals(self):
+        """Yield (key, category, super_category, projected, actual) for months not held in memory."""
+        return iter(())
+
+    def write(self, records, owner):
+        """Persist committed records and return the number of bytes written."""
+        return self.journal.extend(records)
+
+    def needs_compaction(self):
+        return self.journal.record_count >= self.compact_threshold
+
+    def compact(self, owner):
+        """Fold the journal into a fresh snapshot of the owner's data."""
+        with owner.lock:
+            text = json.dumps(budget_to_json(owner.data))
+        size = write_atomic(self.path, text)
+        self.journal.clear()
+        return size
+
+    def import_months(self, months):
+        """Store {key: Month} as the snapshot, replacing whatever was stored before."""
+        size = write_atomic(self.path, json.dumps(budget_to_json(months)))
+        self.journal.clear()
+        return size
+
+    def close(self):
+        pass
+
+class BinarySnapshotStorage(JsonStorage):
+    """JsonStorage with the snapshot kept in the packed format of data.snapshot.
+
+    The journal stays JSON lines; only the snapshot it is folded into changes,
+    which loads and saves several times faster than JSON for a large budget.
+    """
+
+    def load(self):
+        """Return every stored month, read from the memory-mapped snapshot."""
+        if os.path.exists(self.path):
+            return read_snapshot(self.path)
+        return {}
+
+    def compact(self, owner):
+        """Fold the journal into a fresh snapshot of the owner's data."""
+        with owner.lock:
+            size = write_snapshot(self.path, owner.data)
+        self.journal.clear()
+        return size
+
+    def import_months(self, months):
+        """Store {key: Month} as the snapshot, replacing whatever was stored before."""
+        size = write_snapshot(self.path, months)
+        self.journal.clear()
+        return size
+
+class SqliteStorage:
+    """SQLite database with one row per month, category and expense item.
+
+    Months are loaded on demand and totals for months that are not in memory
+    are computed with SUM ... GROUP BY queries, so memory use and startup time
+    do not grow with the length of the history.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS months (
+            year INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            next_id INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (year, month)
+        );
+        CREATE TABLE IF NOT EXISTS categories (
+            year INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            super_category TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (year, month, category)
+        );
+        CREATE TABLE IF NOT EXISTS expenses (
+            year INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            item TEXT NOT NULL,
+            projected REAL NOT NULL,
+            actual REAL NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (year, month, category, item)
+        );
+        CREATE TABLE IF NOT EXISTS transactions (
+            year INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            item TEXT NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT NOT NULL,
+            PRIMARY KEY (year, month, id)
+        );
+        CREATE INDEX IF NOT EXISTS categories_by_super ON categories (year, month, super_category);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # The GUI thread reads and the persistence worker writes through the same connection
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(self.SCHEMA)
+        # Databases written before transaction ids were kept per month lack the column
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(months)")}
+        if "next_id" not in columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE months ADD COLUMN next_id INTEGER NOT NULL DEFAULT 0")
+        self.lazy = True
+
+    def load(self):
+        return {}  # Months are loaded lazily through load_months
+
+    def replay(self):
+        return iter(())  # SQLite keeps its own write-ahead log
+
+    def has_month(self, key):
+        month, year = split_key(key)
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM months WHERE year = ? AND month = ?", (year, month)).fetchone()
+        return row is not None
+
+    def load_months(self, key):
+        """Read one month back from the database as {key: Month}, or return {} if it was never stored."""
+        month, year = split_key(key)
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT next_id FROM months WHERE year = ? AND month = ?", (year, month)).fetchone()
+            if row is None:
+                return {}
+            next_id = row[0]
+            categories = self.connection.execute(
+                "SELECT category, super_category FROM categories WHERE year = ? AND month = ? ORDER BY position",
+                (year, month)).fetchall()
+            expenses = self.connection.execute(
+                "SELECT category, item, projected, actual FROM expenses WHERE year = ? AND month = ? ORDER BY position",
+                (year, month)).fetchall()
+            transactions = self.connection.execute(
+                "SELECT id, date, category, item, amount, description FROM transactions"
+                " WHERE year = ? AND month = ? ORDER BY id", (year, month)).fetchall()
+        intern = sys.intern
+        month_data = Month()
+        for category, super_category in categories:
+            month_data.categories[intern(category)] = Category(super_category)
+        for category, item, projected, actual in expenses:
+            month_data.categories[category].expenses[intern(item)] = ExpenseItem(projected, actual)
+        if transactions or next_id:
+            month_data.transactions = TransactionLog()
+            for transaction_id, when, category, item, amount, description in transactions:
+                month_data.transactions.append(transaction_id, date.fromisoformat(when), intern(category),
+                                               intern(item), amount, description)
+            # Ids of removed transactions are never handed out again, which journal replay relies on
+            month_data.transactions.next_id = max(month_data.transactions.next_id, next_id)
+        return {key: month_data}
+
+    def month_keys(self):
+        """Return the keys of every stored month."""
+        with self._lock:
+            rows = self.connection.execute("SELECT month, year FROM months").fetchall()
+        return [month_key(month, year) for month, year in rows]
+
+    def category_total(self, key, category):
+        month, year = split_key(key)
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT COALESCE(SUM(projected), 0), COALESCE(SUM(actual), 0) FROM expenses"
+                " WHERE year = ? AND month = ? AND category = ?", (year, month, category)).fetchone()
+        return row[0], row[1]
+
+    def super_category_total(self, key, super_category):
+        month, year = split_key(key)
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT COALESCE(SUM(e.projected), 0), COALESCE(SUM(e.actual), 0)"
+                " FROM categories c JOIN expenses e USING (year, month, category)"
+                " WHERE c.year = ? AND c.month = ? AND c.super_category = ?",
+                (year, month, super_category)).fetchone()
+        return row[0], row[1]
+
+    def category_totals(self):
+        """Yield (key, category, super_category, projected, actual) for every stored category."""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT c.month, c.year, c.category, c.super_category,"
+                " COALESCE(SUM(e.projected), 0), COALESCE(SUM(e.actual), 0)"
+                " FROM categories c LEFT JOIN expenses e USING (year, month, category)"
+                " GROUP BY c.year, c.month, c.category ORDER BY c.rowid").fetchall()
+        for month, year, category, super_category, projected, actual in rows:
+            yield month_key(month, year), category, super_category, projected, actual
+
+    def write(self, records, owner):
+        """Rewrite the months touched by the records from the owner's in-memory copy."""
+        keys = {month_key(record["month"], record["year"]) for record in records}
+        with owner.lock:
+            months = {key: owner.data[key].copy() for key in keys}
+            versions = {key // 12: owner.data.dirty.get(key // 12) for key in keys}
+        size = self.import_months(months)
+        owner.data.mark_clean(versions)
+        return size
+
+    def import_months(self, months):
+        """Replace the stored rows for each month in a single transaction.
+
+        Return the approximate number of bytes handed to SQLite.
+        """
+        size = 0
+        with self._lock, self.connection:
+            for key, month_data in months.items():
+                month, year = split_key(key)
+                next_id = month_data.transactions.next_id if month_data.transactions is not None else 0
+                self.connection.execute(
+                    "INSERT INTO months (year, month, next_id) VALUES (?, ?, ?)"
+                    " ON CONFLICT (year, month) DO UPDATE SET next_id = excluded.next_id", (year, month, next_id))
+                self.connection.execute("DELETE FROM categories WHERE year = ? AND month = ?", (year, month))
+                self.connection.execute("DELETE FROM expenses WHERE year = ? AND month = ?", (year, month))
+                self.connection.execute("DELETE FROM transactions WHERE year = ? AND month = ?", (year, month))
+                position = 0
+                for category_position, (category, data) in enumerate(month_data.categories.items()):
+                    self.connection.execute(
+                        "INSERT INTO categories VALUES (?, ?, ?, ?, ?)",
+                        (year, month, category, data.super_category, category_position))
+                    size += len(category) + len(data.super_category) + 24
+                    for item, expense in data.expenses.items():
+                        self.connection.execute(
+                            "INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (year, month, category, item, expense.projected, expense.actual, position))
+                        position += 1
+                        size += len(category) + len(item) + 40
+                if month_data.transactions is not None:
+                    rows = [(year, month, transaction.id, transaction.date.isoformat(), transaction.category,
+                             transaction.item, transaction.amount, transaction.description)
+                            for transaction in month_data.transactions.rows()]
+                    self.connection.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    size += sum(len(row[4]) + len(row[5]) + len(row[7]) + 40 for row in rows)
+        return size
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, owner):
+        return 0  # Every write already lands in the database
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+class ShardedStorage:
+    """A directory with one JSON shard per year, a totals file per year and a small manifest.
+
+    Each year's totals file holds its per-category totals, so the aggregate
+    index is built at startup without opening a single shard. A shard is read
+    the first time one of its months is needed, and a write rewrites only the
+    shards and totals of the years that changed, followed by the manifest,
+    which lists each year's months and shard size. A shard whose size does
+    not match the manifest, e.g. after a crash between the writes, is read
+    again at startup to correct its totals.
+    """
+
+    MANIFEST = "manifest.json"
+    SHARD_NAME = re.compile(r"^(-?\d+)\.json$")
+
+    def __init__(self, path):
+        self.path = path
+        self.lazy = True
+        os.makedirs(path, exist_ok=True)
+        self.sizes = {}  # year -> size of its shard when it was last written
+        self.totals = {}  # year -> {month: [[category, super_category, projected, actual]]}
+        manifest_path = os.path.join(path, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as file:
+                self.sizes = {int(year): size for year, size in json.load(file)["years"].items()}
+        stale = False
+        for name in os.listdir(path):
+            match = self.SHARD_NAME.match(name)
+            if match is None:
+                continue
+            year = int(match.group(1))
+            size = os.path.getsize(os.path.join(path, name))
+            if self.sizes.get(year) == size and os.path.exists(self._totals_path(year)):
+                with open(self._totals_path(year), "r") as file:
+                    self.totals[year] = json.load(file)
+            else:
+                self._write_totals(year, self._month_totals(self._read_shard(year)))
+                self.sizes[year] = size
+                stale = True
+        # Years listed in the manifest whose shard is gone have nothing to load
+        self.sizes = {year: size for year, size in self.sizes.items() if year in self.totals}
+        if stale:
+            self._write_manifest()
+
+    def load(self):
+        return {}  # Shards are loaded lazily through load_months
+
+    def replay(self):
+        return iter(())  # Every write lands directly in the shards
+
+    def has_month(self, key):
+        month, year = split_key(key)
+        return month in self.totals.get(year, ())
+
+    def load_months(self, key):
+        """Read the shard holding a month and return all of its months as {key: Month}."""
+        if not self.has_month(key):
+            return {}
+        return self._read_shard(key // 12)
+
+    def month_keys(self):
+        """Return the keys of every stored month."""
+        return [month_key(month, year) for year, months in self.totals.items() for month in months]
+
+    def category_total(self, key, category):
+        for name, _, projected, actual in self._month_rows(key):
+            if name == category:
+                return projected, actual
+        return 0, 0
+
+    def super_category_total(self, key, super_category):
+        projected_total = 0
+        actual_total = 0
+        for _, name, projected, actual in self._month_rows(key):
+            if name == super_category:
+                projected_total += projected
+                actual_total += actual
+        return projected_total, actual_total
+
+    def category_totals(self):
+        """Yield (key, category, super_category, projected, actual) for every stored category."""
+        for year, months in self.totals.items():
+            for month, rows in months.items():
+                key = month_key(month, year)
+                for category, super_category, projected, actual in rows:
+                    yield key, category, super_category, projected, actual
+
+    def write(self, records, owner):
+        """Rewrite the shards of the years the records touched, then the manifest."""
+        return self._write_years({month_key(record["month"], record["year"]) // 12 for record in records}, owner)
+
+    def import_months(self, months):
+        """Store {key: Month}, replacing the shard of every year in it."""
+        size = 0
+        for year in sorted({key // 12 for key in months}):
+            year_months = {key: months[key] for key in months if key // 12 == year}
+            size += self._write_shard(year, json.dumps(budget_to_json(year_months)), self._month_totals(year_months))
+        return size + self._write_manifest()
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, owner):
+        """Write any year whose changes have not reached its shard yet."""
+        return self._write_years(set(owner.data.dirty), owner) if owner.data.dirty else 0
+
+    def close(self):
+        pass
+
+    def _write_years(self, years, owner):
+        size = 0
+        for year in sorted(years):
+            with owner.lock:
+                months = {key: owner.data[key] for key in list(dict.keys(owner.data)) if key // 12 == year}
+                # MonthCache.materialize loads a year before adding a month to it, but a month that is stored
+                # and not in memory must never be dropped from the shard, so fill any gap from the disk
+                stored = self.totals.get(year, {})
+                if any(month_key(month, year) not in months for month in stored):
+                    for key, month_data in self._read_shard(year).items():
+                        months.setdefault(key, month_data)
+                version = owner.data.dirty.get(year)
+                text = json.dumps(budget_to_json(months))
+                totals = self._month_totals(months)
+            size += self._write_shard(year, text, totals)
+            owner.data.mark_clean({year: version})
+        return size + self._write_manifest()
+
+    def _write_shard(self, year, text, totals):
+        """Write a year's shard and then its totals."""
+        size = write_atomic(self._shard_path(year), text)
+        self.sizes[year] = os.path.getsize(self._shard_path(year))
+        return size + self._write_totals(year, totals)
+
+    def _write_totals(self, year, totals):
+        self.totals[year] = totals
+        return write_atomic(self._totals_path(year), json.dumps(totals))
+
+    def _write_manifest(self):
+        years = {str(year): self.sizes[year] for year in sorted(self.sizes)}
+        return write_atomic(os.path.join(self.path, self.MANIFEST), json.dumps({"format": 1, "years": years}))
+
+    def _read_shard(self, year):
+        with open(self._shard_path(year), "r") as file:
+            return budget_from_json(json.load(file))
+
+    def _shard_path(self, year):
+        return os.path.join(self.path, f"{year}.json")
+
+    def _totals_path(self, year):
+        return os.path.join(self.path, f"{year}.totals.json")
+
+    def _month_totals(self, months):
+        """Return {month: [[category, super_category, projected, actual]]} for a year's {key: Month}."""
+        return {split_key(key)[0]: [[category, data.super_category] + list(data.totals())
+                                    for category, data in months[key].categories.items()]
+                for key in sorted(months)}
+
+    def _month_rows(self, key):
+        month, year = split_key(key)
+        return self.totals.get(year, {}).get(month, [])
+
+# Data paths with this extension are directories holding one shard per year
+SHARDED_EXTENSION = ".shards"
+# Data paths with this extension keep a binary snapshot instead of JSON
+BINARY_EXTENSION = ".fbin"
+
+def open_storage(path, compact_threshold):
+    """Pick a storage backend from the data file's extension."""
+    extension = os.path.splitext(path)[1]
+    if extension in (".db", ".sqlite", ".sqlite3"):
+        return SqliteStorage(path)
+    if extension == SHARDED_EXTENSION:
+        return ShardedStorage(path)
+    if extension == BINARY_EXTENSION:
+        return BinarySnapshotStorage(path, compact_threshold)
+    return JsonStorage(path, compact_threshold)
@@ -0,0 +1,690 @@
+from collections import deque, namedtuple
+from contextlib import contextmanager
+import math
+import os
+import sys
+import threading
+from datetime import date
+
+from data.aggregates import AggregateIndex
+from data.persistence import PersistenceWorker
+from data.rollups import SPANS, bucket_label
+from data.model import Category, ExpenseItem, month_from_json, month_key
+from data.storage import MonthCache, open_storage
+from data.transactions import TransactionLog
+from utils.instrumentation import timed
+
+# Categories and expense items every new month starts with
+DEFAULT_MONTH = month_from_json({
+    "categories": {
+        "Housing": {
+            "super_category": "NEEDS",
+            "expenses": {
+                "Mortgage/Rent": {"projected": 0, "actual": 0},
+                "Utilities (Electricity, Gas, Water)": {"projected": 0, "actual": 0},
+                "Cable": {"projected": 0, "actual": 0},
+                "Waste Removal": {"projected": 0, "actual": 0},
+                "Maintenance": {"projected": 0, "actual": 0},
+                "Supplies": {"projected": 0, "actual": 0},
+            },
+        },
+        "Transportation": {
+            "super_category": "NEEDS",
+            "expenses": {
+                "Car Payment": {"projected": 0, "actual": 0},
+                "Gas": {"projected": 0, "actual": 0},
+                "Insurance": {"projected": 0, "actual": 0},
+                "Maintenance": {"projected": 0, "actual": 0},
+                "Public Transportation": {"projected": 0, "actual": 0},
+            },
+        },
+        "Food": {
+            "super_category": "NEEDS",
+            "expenses": {
+                "Groceries": {"projected": 0, "actual": 0},
+                "Dining Out": {"projected": 0, "actual": 0},
+            },
+        },
+        "Entertainment": {
+            "super_category": "FUN",
+            "expenses": {
+                "Movies": {"projected": 0, "actual": 0},
+                "Concerts": {"projected": 0, "actual": 0},
+                "Sports": {"projected": 0, "actual": 0},
+            },
+        },
+        "Savings": {
+            "super_category": "FUTURE",
+            "expenses": {
+                "Emergency Fund": {"projected": 0, "actual": 0},
+                "Retirement": {"projected": 0, "actual": 0},
+                "Investments": {"projected": 0, "actual": 0},
+            },
+        },
+        "Health": {
+            "super_category": "NEEDS",
+            "expenses": {
+                "Insurance": {"projected": 0, "actual": 0},
+                "Medication": {"projected": 0, "actual": 0},
+                "Doctor Visits": {"projected": 0, "actual": 0},
+            },
+        },
+        "Insurance": {
+            "super_category": "NEEDS",
+            "expenses": {
+                "Health Insurance": {"projected": 0, "actual": 0},
+                "Life Insurance": {"projected": 0, "actual": 0},
+                "Auto Insurance": {"projected": 0, "actual": 0},
+            },
+        },
+    }
+})
+
+# Shared view handed out for months that have not been written yet
+DEFAULT_MONTH_VIEW = DEFAULT_MONTH.frozen()
+
+# Super categories whose share of the projected total the summary reports
+SUPER_CATEGORIES = ["NEEDS", "FUN", "FUTURE"]
+
+# Kinds of change passed to BudgetStore listeners
+ADDED = "added"
+REMOVED = "removed"
+UPDATED = "updated"
+
+# What each journal operation does to the category or expense item it names
+CHANGE_KINDS = {
+    "add_category": ADDED,
+    "remove_category": REMOVED,
+    "add_expense": ADDED,
+    "remove_expense": REMOVED,
+    "update_expense": UPDATED,
+    "add_transaction": UPDATED,
+    "remove_transaction": UPDATED,
+    "restore_transactions": UPDATED,
+}
+
+# How each operation is named in the undo history
+OPERATION_NAMES = {
+    "add_category": "Add category",
+    "remove_category": "Remove category",
+    "add_expense": "Add expense item",
+    "remove_expense": "Remove expense item",
+    "update_expense": "Edit",
+    "add_transaction": "Add transaction to",
+    "remove_transaction": "Remove transaction from",
+    "restore_transactions": "Restore transactions of",
+}
+
+# One undoable edit or batch: its description and the packed records that reverse it, in order
+HistoryStep = namedtuple("HistoryStep", "description records")
+
+# Key tuples shared by every packed history record with the same fields
+_RECORD_KEYS = {}
+
+def _pack(record):
+    """Store a record as (shared key tuple, value tuple), a fraction of the size of the dict."""
+    keys = tuple(record)
+    return _RECORD_KEYS.setdefault(keys, keys), tuple(record.values())
+
+def _unpack(packed):
+    keys, values = packed
+    return dict(zip(keys, values))
+
+class BudgetStore:
+    """The budget, its aggregate caches and its storage, with no dependency on Qt.
+
+    Code that wants to hear about changes adds a callable to listeners; after
+    each commit or batch it is called with {(month, year, category,
+    expense_item): kind}, where expense_item is "" when the category itself was
+    added or removed. data.budget_data.BudgetData turns these into Qt signals.
+
+    Every commit or batch also leaves a step in the undo history made of the
+    records that reverse it, so history grows with the size of each edit and
+    not with the size of the budget. Callables in history_listeners are called
+    with the step's description whenever a new step is recorded.
+    """
+
+    # Number of journaled edits after which the journal is folded into the snapshot
+    COMPACT_THRESHOLD = 500
+    # Years a lazily loaded budget (SQLite or sharded) keeps in memory at once
+    CACHE_YEARS = 10
+    # Undo steps kept; the oldest is forgotten when another is recorded
+    HISTORY_LIMIT = 5000
+
+    def __init__(self, data_file="budget_data.json", debug_aggregates=None, cache_years=None):
+        self.data_file = data_file
+        self.listeners = []
+        self.history_listeners = []
+        self.undo_steps = deque(maxlen=self.HISTORY_LIMIT)
+        self.redo_steps = []
+        self._history_target = None  # redo_steps or undo_steps while undo() or redo() replays a step
+        # In debug mode every cached total is checked against a full recompute
+        if debug_aggregates is None:
+            debug_aggregates = bool(os.environ.get("FAMILYBUDGET_DEBUG_AGGREGATES"))
+        self.debug_aggregates = debug_aggregates
+        self.aggregates = AggregateIndex()
+        # Bumped on every change so derived views (charts, data frames) know when to rebuild
+        self.version = 0
+        self.month_versions = {}  # key -> version of the last change to that month
+        json_file = os.path.splitext(data_file)[0] + ".json"
+        if data_file != json_file and not os.path.exists(data_file) and os.path.exists(json_file):
+            convert_budget(json_file, data_file)  # One-shot upgrade of an existing budget
+        self.storage = open_storage(data_file, self.COMPACT_THRESHOLD)
+        self._batch = None  # Pending records and month backups while inside batch()
+        # Guards self.data while the persistence worker serializes a snapshot
+        self.lock = threading.RLock()
+        self.data = MonthCache(self.storage, self.CACHE_YEARS if cache_years is None else cache_years)
+        self.load_data()  # Load data from the storage backend
+        self.persistence = PersistenceWorker(self.storage, self)
+        self.persistence.start()
+
+    @timed()
+    def add_category(self, month, year, category, super_category):
+        """Add a new category with a super category."""
+        self._commit({"op": "add_category", "month": month, "year": year,
+                      "category": category, "super_category": super_category})
+
+    @timed()
+    def remove_category(self, month, year, category):
+        """Remove a category and its expenses."""
+        self._commit({"op": "remove_category", "month": month, "year": year, "category": category})
+
+    @timed()
+    def add_expense(self, month, year, category, expense_item, projected=0, actual=0):
+        """Add an expense item under a category."""
+        self._commit({"op": "add_expense", "month": month, "year": year, "category": category,
+                      "item": expense_item, "projected": projected, "actual": actual})
+
+    @timed()
+    def remove_expense(self, month, year, category, expense_item):
+        """Remove an expense item from a category."""
+        self._commit({"op": "remove_expense", "month": month, "year": year,
+                      "category": category, "item": expense_item})
+
+    @timed()
+    def update_expense(self, month, year, category, expense_item, projected, actual):
+        """Update the projected and actual costs for an expense item."""
+        self._commit({"op": "update_expense", "month": month, "year": year, "category": category,
+                      "item": expense_item, "projected": projected, "actual": actual})
+
+    @timed()
+    def add_transaction(self, month, year, category, expense_item, when, amount, description=""):
+        """Record a dated purchase against an expense item and add it to the item's actual cost.
+
+        Return the transaction's id, which is unique within the month.
+        """
+        month_data = self.get_data(month, year)
+        expense = month_data.categories[category].expenses.get(expense_item) if category in month_data.categories else None
+        if expense is None:
+            raise KeyError(f"No expense item {expense_item!r} in {category!r}")
+        transaction_id = month_data.transactions.next_id if month_data.transactions is not None else 0
+        # The record carries the resulting actual cost so that replaying it sets state like every other op
+        self._commit({"op": "add_transaction", "month": month, "year": year, "category": category,
+                      "item": expense_item, "id": transaction_id, "date": when.isoformat(),
+                      "amount": amount, "description": description, "actual": expense.actual + amount})
+        return transaction_id
+
+    @timed()
+    def remove_transaction(self, month, year, transaction_id):
+        """Remove a transaction and take its amount off the item's actual cost."""
+        transactions = self.get_data(month, year).transactions
+        transaction = transactions.get(transaction_id) if transactions is not None else None
+        if transaction is None:
+            return
+        expense = self.get_data(month, year).categories[transaction.category].expenses[transaction.item]
+        self._commit({"op": "remove_transaction", "month": month, "year": year, "category": transaction.category,
+                      "item": transaction.item, "id": transaction_id, "actual": expense.actual - transaction.amount})
+
+    def get_transactions(self, month, year, category=None, expense_item=None):
+        """Return a month's transactions, optionally only those of a category or expense item."""
+        transactions = self.get_data(month, year).transactions
+        if transactions is None:
+            return []
+        return list(transactions.rows(category, expense_item))
+
+    def assignments(self):
+        """Yield (description, category, expense_item, super_category) for every transaction in the budget."""
+        for key in self.month_keys():
+            month_data = self.data[key]
+            if month_data.transactions is None:
+                continue
+            for transaction in month_data.transactions.rows():
+                yield (transaction.description, transaction.category, transaction.item,
+                       month_data.categories[transaction.category].super_category)
+
+    @timed()
+    def bulk_update(self, month, year, rows):
+        """Update many expense items at once from (category, expense_item, projected, actual) rows."""
+        with self.batch():
+            for category, expense_item, projected, actual in rows:
+                self.update_expense(month, year, category, expense_item, projected, actual)
+
+    @contextmanager
+    def batch(self, description=None):
+        """Group mutations so they are journaled once, announced with a single signal and undone as one step.
+
+        If the block raises, every month touched inside it is restored and nothing is written.
+        Nested batches join the outermost one.
+        """
+        if self._batch is not None:
+            yield
+            return
+        # Holding the lock keeps the worker from snapshotting a half-applied batch
+        with self.lock:
+            self._batch = {"records": [], "backups": {}, "inverse": []}
+            try:
+                yield
+            except BaseException:
+                backups = self._batch["backups"]
+                for key, backup in backups.items():
+                    self._touch(key)
+                    if backup is None:
+                        self.data.pop(key, None)
+                    else:
+                        self.data[key] = backup
+                self.aggregates.reindex(backups)
+                raise
+            else:
+                inverse = self._batch["inverse"]
+                # The batch fed its months' totals in as many small deltas; replace them with exact sums
+                changed = {month_key(record["month"], record["year"]) for record in self._batch["records"]}
+                self.aggregates.reindex({key: self.data[key] for key in changed})
+            finally:
+                records = self._batch["records"]
+                self._batch = None
+        if records:
+            if description is None:
+                description = self._describe(records[0]) if len(records) == 1 else f"{len(records)} changes"
+            # Later records are reversed first
+            self._record_step(description, [packed for step in reversed(inverse) for packed in step])
+            self._announce(records)  # Once for the whole batch
+            self.persistence.submit(records)
+
+    def undo(self):
+        """Reverse the most recent edit or batch.
+
+        Return its description, or None if there is nothing to undo. The GUI
+        goes through BudgetData.undo_stack instead, which calls this.
+        """
+        return self._replay_step(self.undo_steps, self.redo_steps)
+
+    def redo(self):
+        """Make the most recently undone edit or batch again; return its description or None."""
+        return self._replay_step(self.redo_steps, self.undo_steps)
+
+    def _replay_step(self, source, target):
+        """Commit a history step's records as one batch, recording their reverse onto target."""
+        if not source:
+            return None
+        step = source.pop()
+        recorded = len(target)
+        self._history_target = target
+        try:
+            with self.batch(step.description):
+                for packed in step.records:
+                    self._commit(_unpack(packed))
+        finally:
+            self._history_target = None
+        if len(target) == recorded:
+            target.append(HistoryStep(step.description, []))  # Keeps the steps in line with BudgetData.undo_stack
+        return step.description
+
+    def _record_step(self, description, records):
+        """Add a history step, or hand it to the undo or redo being replayed."""
+        step = HistoryStep(description, records)
+        if self._history_target is not None:
+            self._history_target.append(step)
+            return
+        self.undo_steps.append(step)
+        self.redo_steps.clear()  # A new edit forks the history
+        for listener in self.history_listeners:
+            listener(description)
+
+    def _describe(self, record):
+        return f"{OPERATION_NAMES[record['op']]} {record.get('item') or record['category']}"
+
+    def _commit(self, record):
+        """Apply a mutation record, notify listeners and append it to the journal."""
+        key = month_key(record["month"], record["year"])
+        if self._batch is not None:
+            self._backup_month(key)
+            inverse = self._inverse(record)
+            if self._apply(record):
+                self._touch(key)
+                self._batch["records"].append(record)
+                self._batch["inverse"].append(inverse)
+        else:
+            with self.lock:
+                inverse = self._inverse(record)
+                changed = self._apply(record)
+            if changed:
+                self._touch(key)
+                self._record_step(self._describe(record), inverse)
+                self._announce([record])
+                self.persistence.submit([record])
+
+    def _announce(self, records):
+        """Tell the listeners which categories and expense items the records touched, once each."""
+        changes = {}
+        for record in records:
+            target = (record["month"], record["year"], record["category"], record.get("item", ""))
+            kind = CHANGE_KINDS[record["op"]]
+            first = changes.get(target)
+            if first is None or kind == REMOVED:
+                changes[target] = kind
+            elif first == REMOVED:
+                changes[target] = UPDATED  # Removed and then added back within one batch
+        for listener in self.listeners:
+            listener(changes)
+
+    def _touch(self, key):
+        """Record that a month changed."""
+        self.version += 1
+        self.month_versions[key] = self.version
+        self.data.mark_dirty(key, self.version)  # Keeps the month's year in memory until it is written
+
+    def _backup_month(self, key):
+        """Remember how a month looked before the current batch first touched it."""
+        backups = self._batch["backups"]
+        if key not in backups:
+            backups[key] = self.data[key].copy() if key in self.data else None
+
+    def _inverse(self, record):
+        """Return the packed records that reverse a mutation record, read from the data before it is applied."""
+        op = record["op"]
+        month = record["month"]
+        year = record["year"]
+        category = record["category"]
+        month_data = self.get_data(month, year)
+        data = month_data.categories.get(category)
+        if op == "add_category":
+            return [_pack({"op": "remove_category", "month": month, "year": year, "category": category})]
+        if data is None:
+            return []
+        transactions = month_data.transactions
+        if op == "remove_category":
+            inverse = [_pack({"op": "add_category", "month": month, "year": year, "category": category,
+                              "super_category": data.super_category})]
+            for item, expense in data.expenses.items():
+                inverse.append(_pack({"op": "add_expense", "month": month, "year": year, "category": category,
+                                      "item": item, "projected": expense.projected, "actual": expense.actual}))
+            return inverse + self._restore_records(month, year, category, transactions and transactions.rows(category))
+        if op == "restore_transactions":
+            # Restoring leaves actual costs alone, so each removal puts back the item's current one
+            return [_pack({"op": "remove_transaction", "month": month, "year": year, "category": category,
+                           "item": row[2], "id": row[0], "actual": data.expenses[row[2]].actual})
+                    for row in record["rows"] if row[2] in data.expenses]
+        item = record["item"]
+        expense = data.expenses.get(item)
+        if expense is None:
+            if op == "add_expense":
+                return [_pack({"op": "remove_expense", "month": month, "year": year, "category": category, "item": item})]
+            return []
+        if op == "remove_expense":
+            return [_pack({"op": "add_expense", "month": month, "year": year, "category": category, "item": item,
+                           "projected": expense.projected, "actual": expense.actual})] + self._restore_records(
+                month, year, category, transactions and transactions.rows(category, item))
+        if op == "add_transaction":
+            return [_pack({"op": "remove_transaction", "month": month, "year": year, "category": category,
+                           "item": item, "id": record["id"], "actual": expense.actual})]
+        # add_expense of an existing item, update_expense and remove_transaction all end by setting the costs
+        inverse = [_pack({"op": "update_expense", "month": month, "year": year, "category": category, "item": item,
+                          "projected": expense.projected, "actual": expense.actual})]
+        if op == "remove_transaction":
+            transaction = transactions.get(record["id"]) if transactions is not None else None
+            inverse = self._restore_records(month, year, category, transaction and [transaction]) + inverse
+        return inverse
+
+    def _restore_records(self, month, year, category, transactions):
+        """Return a packed restore_transactions record for the Transactions, or nothing if there are none."""
+        rows = [(transaction.id, transaction.date.isoformat(), transaction.item, transaction.amount,
+                 transaction.description) for transaction in transactions or ()]
+        if not rows:
+            return []
+        return [_pack({"op": "restore_transactions", "month": month, "year": year, "category": category, "rows": rows})]
+
+    def _apply(self, record):
+        """Apply a mutation record to the in-memory data and the aggregate index.
+
+        Return True if anything changed.
+        """
+        key = month_key(record["month"], record["year"])
+        op = record["op"]
+        if op not in CHANGE_KINDS:
+            raise ValueError(f"Unknown journal operation: {op}")
+        category = record["category"]
+        categories = self.get_data(record["month"], record["year"]).categories
+        # Leave untouched months as the shared template when the record is a no-op
+        if op == "add_category":
+            if category in categories:
+                return False
+        elif category not in categories:
+            return False
+        elif (op not in ("add_category", "remove_category", "add_expense", "restore_transactions")
+              and record["item"] not in categories[category].expenses):
+            return False
+        month_data = self.data.materialize(key, DEFAULT_MONTH)
+        categories = month_data.categories
+        if op == "add_category":
+            category = sys.intern(category)
+            categories[category] = Category(record["super_category"])
+            self.aggregates.add(key, category, categories[category].super_category, 0, 0)
+            return True
+        super_category = categories[category].super_category
+        expenses = categories[category].expenses
+        if op == "restore_transactions":
+            # Puts back transactions an undo brought back; their amounts are already in the actual costs
+            if month_data.transactions is None:
+                month_data.transactions = TransactionLog()
+            for transaction_id, when, item, amount, description in record["rows"]:
+                month_data.transactions.restore(transaction_id, date.fromisoformat(when), category,
+                                                sys.intern(item), amount, description)
+            return True
+        if op == "remove_category":
+            del categories[category]
+            self.aggregates.remove_category(key, category, super_category)
+            if month_data.transactions is not None:
+                month_data.transactions.remove_target(category)
+            return True
+        item = expenses.get(record["item"])
+        if op == "remove_expense":
+            del expenses[record["item"]]
+            self.aggregates.add(key, category, super_category, -item.projected, -item.actual)
+            if month_data.transactions is not None:
+                month_data.transactions.remove_target(category, record["item"])
+            return True
+        # actual is the running sum of the item's transactions plus any manual adjustment
+        if op in ("add_transaction", "remove_transaction"):
+            transactions = month_data.transactions
+            if op == "remove_transaction":
+                if transactions is not None:
+                    transactions.remove(record["id"])
+            # Ids only grow, so an id below next_id was already added when the journal is replayed
+            elif transactions is None or record["id"] >= transactions.next_id:
+                if transactions is None:
+                    transactions = month_data.transactions = TransactionLog()
+                transactions.append(record["id"], date.fromisoformat(record["date"]), category,
+                                    sys.intern(record["item"]), record["amount"], record["description"])
+            self.aggregates.add(key, category, super_category, 0, record["actual"] - item.actual)
+            item.actual = record["actual"]
+            return True
+        if item is None:
+            item = expenses[sys.intern(record["item"])] = ExpenseItem()
+        self.aggregates.add(key, category, super_category,
+                            record["projected"] - item.projected, record["actual"] - item.actual)
+        item.projected = record["projected"]
+        item.actual = record["actual"]
+        return True
+
+    @timed()
+    def get_category_total(self, month, year, category):
+        """Return the cached total projected and actual costs for a category."""
+        key = month_key(month, year)
+        total = self.aggregates.category_total(key, category)
+        if self.debug_aggregates:
+            self._verify_total(total, self._recompute(key, category=category), key, category)
+        return total
+
+    @timed()
+    def get_super_category_total(self, month, year, super_category):
+        """Return the cached total projected and actual costs for a super category."""
+        key = month_key(month, year)
+        total = self.aggregates.super_category_total(key, super_category)
+        if self.debug_aggregates:
+            self._verify_total(total, self._recompute(key, super_category=super_category), key, super_category)
+        return total
+
+    @timed()
+    def get_month_total(self, month, year):
+        """Return the cached total projected and actual costs for a whole month."""
+        key = month_key(month, year)
+        total = self.aggregates.month_total(key)
+        if self.debug_aggregates:
+            self._verify_total(total, self._recompute(key), key, "month")
+        return total
+
+    @timed()
+    def get_rollup(self, resolution, first, last, category=None, super_category=None):
+        """Return the cached totals of buckets first..last (inclusive) at a quarter, year or decade resolution.
+
+        Bucket numbers come from data.rollups.bucket_of. Each entry is
+        (projected, actual), or None for a bucket with nothing budgeted in it,
+        optionally narrowed to one category or super category.
+        """
+        totals = self.aggregates.rollups.range(resolution, first, last, category, super_category)
+        if self.debug_aggregates:
+            span = SPANS[resolution]
+            for bucket, total in zip(range(first, last + 1), totals):
+                recomputed = [0, 0]
+                for key in range(bucket * span, (bucket + 1) * span):
+                    projected, actual = self._recompute(key, category, super_category)
+                    recomputed[0] += projected
+                    recomputed[1] += actual
+                self._verify_total(total or (0, 0), recomputed, bucket_label(resolution, bucket), category or super_category or resolution)
+        return totals
+
+    @timed()
+    def month_summary(self, month, year):
+        """Return the totals the Summary tab shows for a month.
+
+        That is {"projected", "actual", "difference", "categories": [(category,
+        super_category, projected, actual)], "allocation": {super_category:
+        percent of the projected total}}.
+        """
+        projected, actual = self.get_month_total(month, year)
+        categories = self.get_data(month, year).categories
+        allocation = {}
+        for super_category in SUPER_CATEGORIES:
+            super_projected, _ = self.get_super_category_total(month, year, super_category)
+            allocation[super_category] = (super_projected / projected) * 100 if projected != 0 else 0
+        return {
+            "projected": projected,
+            "actual": actual,
+            "difference": projected - actual,
+            "categories": [(category, data.super_category) + self.get_category_total(month, year, category)
+                           for category, data in categories.items()],
+            "allocation": allocation,
+        }
+
+    def month_keys(self):
+        """Return the ordinal keys of every month that is stored or held in memory, in time order."""
+        return sorted(set(self.storage.month_keys()).union(dict.keys(self.data)))
+
+    def month_totals(self):
+        """Return {month_key: (projected, actual)} for every month."""
+        return {key: self.aggregates.month_total(key) for key in self.month_keys()}
+
+    def category_totals(self):
+        """Return {category: (projected, actual)} summed over every month."""
+        return self.aggregates.overall_totals()
+
+    def _recompute(self, key, category=None, super_category=None):
+        """Sum a total the slow way, straight from the expense items."""
+        if not self.data.is_loaded(key):
+            if key not in self.data:
+                return 0, 0
+            if category is not None:
+                return self.storage.category_total(key, category)
+            if super_category is not None:
+                return self.storage.super_category_total(key, super_category)
+        projected_total = 0
+        actual_total = 0
+        for name, data in self.data[key].categories.items():
+            if category is not None and name != category:
+                continue
+            if super_category is not None and data.super_category != super_category:
+                continue
+            projected, actual = data.totals()
+            projected_total += projected
+            actual_total += actual
+        return projected_total, actual_total
+
+    def _verify_total(self, cached, recomputed, key, name):
+        """Raise if a cached total has drifted from the recomputed one."""
+        if not all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6) for a, b in zip(cached, recomputed)):
+            raise AssertionError(f"Aggregate cache mismatch for {name} in {key}: cached {cached}, recomputed {recomputed}")
+
+    def _category_rows(self):
+        """Yield (key, category, super_category, projected, actual) for every month."""
+        for row in self.storage.category_totals():
+            if not self.data.is_loaded(row[0]):
+                yield row
+        for key, month_data in list(dict.items(self.data)):
+            for category, data in month_data.categories.items():
+                yield (key, category, data.super_category) + data.totals()
+
+    def get_data(self, month, year):
+        """Return the current budget data for a specific month and year.
+
+        Months that were never written return the shared, read-only default
+        template; it is copied into the store only when the month is first edited.
+        """
+        key = month_key(month, year)
+        if key in self.data:
+            month_data = self.data[key]
+            self.data.use(key)
+            return month_data
+        return DEFAULT_MONTH_VIEW
+
+    @timed()
+    def save_data(self):
+        """Ask the persistence worker to write a full snapshot of the data."""
+        self.persistence.request_snapshot()
+
+    @timed()
+    def flush(self):
+        """Block until every committed change has been written to disk."""
+        return self.persistence.flush()
+
+    def close(self):
+        """Write any pending changes, stop the persistence worker and close the storage."""
+        flushed = self.persistence.stop()
+        self.storage.close()
+        return flushed
+
+    def save_stats(self):
+        """Return the persistence worker's write counters and latencies."""
+        return dict(self.persistence.stats)
+
+    @timed()
+    def load_data(self):
+        """Load the budget data from the storage backend and replay any journaled edits."""
+        self.data.update(self.storage.load())
+        self.aggregates.rebuild(self._category_rows())
+        # Replaying is safe even if a crash hit between writing the snapshot and
+        # clearing the journal: every operation sets state rather than adding to it.
+        for record in self.storage.replay():
+            self._apply(record)
+
+def convert_budget(source_file, target_file):
+    """Copy every month of a budget, including unsaved journal records, into a budget file of another format.
+
+    The extensions pick the formats, so this upgrades a JSON budget to SQLite,
+    shards or a binary snapshot, and exports any of them back to JSON.
+    """
+    source = BudgetStore(source_file, cache_years=0)
+    months = {key: source.data[key] for key in source.month_keys()}  # Pulls in months a lazy backend left on disk
+    source.close()
+    target = open_storage(target_file, BudgetStore.COMPACT_THRESHOLD)
+    target.import_months(months)
+    target.close()
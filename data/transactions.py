@@ -0,0 +1,147 @@
+import sys
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import date
+
+# One dated purchase, as handed out by TransactionLog
+Transaction = namedtuple("Transaction", "id date category item amount description")
+
+class TransactionLog:
+    """The dated transactions of one month, stored column-wise in typed arrays.
+
+    Appending is amortised O(1) and a row costs a few dozen bytes plus its
+    description. Category/item pairs are kept once in a small table and rows
+    refer to them by index. Ids only ever grow, which is what makes journal
+    replay of an add idempotent: an id below next_id has already been seen.
+    Rows stay in id order, so looking one up is a binary search.
+    """
+
+    __slots__ = ("ids", "days", "amounts", "targets", "descriptions", "target_names", "target_codes", "next_id")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.days = array("l")  # date.toordinal()
+        self.amounts = array("d")
+        self.targets = array("l")  # Index into target_names
+        self.descriptions = []
+        self.target_names = []  # [(category, item)]
+        self.target_codes = {}  # (category, item) -> index into target_names
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, transaction_id, when, category, item, amount, description=""):
+        """Add a transaction with an id at least next_id."""
+        code = self._target_code(category, item)
+        self.ids.append(transaction_id)
+        self.days.append(when.toordinal())
+        self.amounts.append(amount)
+        self.targets.append(code)
+        self.descriptions.append(sys.intern(description))
+        self.next_id = max(self.next_id, transaction_id + 1)
+
+    def restore(self, transaction_id, when, category, item, amount, description=""):
+        """Put back a removed transaction in id order. An id that is already there is left alone."""
+        position = bisect_left(self.ids, transaction_id)
+        if position < len(self.ids) and self.ids[position] == transaction_id:
+            return
+        code = self._target_code(category, item)
+        self.ids.insert(position, transaction_id)
+        self.days.insert(position, when.toordinal())
+        self.amounts.insert(position, amount)
+        self.targets.insert(position, code)
+        self.descriptions.insert(position, sys.intern(description))
+        self.next_id = max(self.next_id, transaction_id + 1)
+
+    def get(self, transaction_id):
+        """Return the Transaction with an id, or None."""
+        position = self._position(transaction_id)
+        if position is None:
+            return None
+        return self._row(position)
+
+    def remove(self, transaction_id):
+        """Remove a transaction and return it, or return None if there is none with that id."""
+        position = self._position(transaction_id)
+        if position is None:
+            return None
+        transaction = self._row(position)
+        for column in (self.ids, self.days, self.amounts, self.targets, self.descriptions):
+            del column[position]
+        return transaction
+
+    def remove_target(self, category, item=None):
+        """Drop every transaction of a category, or of one of its items."""
+        codes = {code for code, (name, item_name) in enumerate(self.target_names)
+                 if name == category and (item is None or item_name == item)}
+        if not codes:
+            return
+        keep = [position for position, code in enumerate(self.targets) if code not in codes]
+        self.ids = array("q", (self.ids[position] for position in keep))
+        self.days = array("l", (self.days[position] for position in keep))
+        self.amounts = array("d", (self.amounts[position] for position in keep))
+        self.targets = array("l", (self.targets[position] for position in keep))
+        self.descriptions = [self.descriptions[position] for position in keep]
+
+    def rows(self, category=None, item=None):
+        """Yield the Transactions, optionally only those of a category or item, in the order added (id order)."""
+        for position in range(len(self.ids)):
+            name, item_name = self.target_names[self.targets[position]]
+            if (category is None or name == category) and (item is None or item_name == item):
+                yield self._row(position)
+
+    def weekly_totals(self):
+        """Return {Monday of the week: summed amount}, in date order."""
+        totals = {}
+        for day, amount in zip(self.days, self.amounts):
+            monday = date.fromordinal(day - date.fromordinal(day).weekday())
+            totals[monday] = totals.get(monday, 0) + amount
+        return dict(sorted(totals.items()))
+
+    def copy(self):
+        log = TransactionLog()
+        log.ids = array("q", self.ids)
+        log.days = array("l", self.days)
+        log.amounts = array("d", self.amounts)
+        log.targets = array("l", self.targets)
+        log.descriptions = list(self.descriptions)
+        log.target_names = list(self.target_names)
+        log.target_codes = dict(self.target_codes)
+        log.next_id = self.next_id
+        return log
+
+    def to_json(self):
+        return {
+            "next_id": self.next_id,
+            "rows": [[transaction.id, transaction.date.isoformat(), transaction.category, transaction.item,
+                      transaction.amount, transaction.description] for transaction in self.rows()],
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        log = cls()
+        for transaction_id, when, category, item, amount, description in data["rows"]:
+            log.append(transaction_id, date.fromisoformat(when), sys.intern(category), sys.intern(item), amount, description)
+        log.next_id = max(log.next_id, data.get("next_id", 0))
+        return log
+
+    def _target_code(self, category, item):
+        target = (category, item)
+        code = self.target_codes.get(target)
+        if code is None:
+            code = self.target_codes[target] = len(self.target_names)
+            self.target_names.append(target)
+        return code
+
+    def _position(self, transaction_id):
+        position = bisect_left(self.ids, transaction_id)
+        if position < len(self.ids) and self.ids[position] == transaction_id:
+            return position
+        return None
+
+    def _row(self, position):
+        category, item = self.target_names[self.targets[position]]
+        return Transaction(self.ids[position], date.fromordinal(self.days[position]), category, item,
+                           self.amounts[position], self.descriptions[position])
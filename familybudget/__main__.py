@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+
+from data.model import MONTHS
+from data.store import convert_budget
+from familybudget.report import run_report
+
+def main(argv=None):
+    """Run the headless command line; return the process exit code."""
+    parser = argparse.ArgumentParser(prog="python -m familybudget",
+                                     description="Family budget tools that run without a display.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="per-month category and super category totals of many budget files")
+    report.add_argument("paths", nargs="+", help="budget files (.json, .db, .shards or .fbin), or directories holding them")
+    report.add_argument("--format", choices=("csv", "json"), default="csv", help="output format (default: csv)")
+    report.add_argument("-o", "--output", help="write to this file instead of standard output")
+    report.add_argument("-j", "--jobs", type=int, help="worker processes (default: one per CPU)")
+    report.add_argument("--year", type=int, help="only report this year")
+    report.add_argument("--month", choices=MONTHS, help="only report this month")
+    convert = commands.add_parser("convert", help="copy a budget into another format, e.g. JSON to a binary snapshot")
+    convert.add_argument("source", help="budget to read")
+    convert.add_argument("target", help="budget to create; its extension (.json, .db, .shards or .fbin) picks the format")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        if not os.path.exists(args.source):
+            parser.error(f"no such budget file: {args.source}")
+        if os.path.exists(args.target):
+            parser.error(f"{args.target} already exists")
+        convert_budget(args.source, args.target)
+        return 0
+    if args.output is None:
+        failures = run_report(args.paths, sys.stdout, args.format, args.jobs, args.year, args.month)
+    else:
+        with open(args.output, "w", newline="") as output:
+            failures = run_report(args.paths, output, args.format, args.jobs, args.year, args.month)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
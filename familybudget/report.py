@@ -0,0 +1,129 @@
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from data.model import split_key
+from data.storage import BINARY_EXTENSION, SHARDED_EXTENSION
+from data.store import BudgetStore
+
+# Files picked up when a directory is given; categorization rules share the .json extension
+BUDGET_EXTENSIONS = (".json", ".db", ".sqlite", ".sqlite3", SHARDED_EXTENSION, BINARY_EXTENSION)
+RULES_SUFFIX = ".rules.json"
+
+# Columns of the report. level is "category", "super_category" or "month";
+# allocation is the super category's share of the month's projected total.
+FIELDS = ["file", "year", "month", "level", "name", "super_category", "projected", "actual", "difference", "allocation"]
+
+def find_budgets(paths):
+    """Return the budget files named by paths, expanding each directory into the budgets directly inside it."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path) and os.path.splitext(path)[1] != SHARDED_EXTENSION:
+            found.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if os.path.splitext(name)[1] in BUDGET_EXTENSIONS and not name.endswith(RULES_SUFFIX)))
+        else:
+            found.append(path)
+    return found
+
+def report_file(path, year=None, month=None):
+    """Return the report rows for one budget file, optionally only for one year or month.
+
+    Every month gets a row per category, one per super category and a total,
+    with the same figures the Summary tab shows.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No such budget file: {path}")  # Opening would create an empty budget
+    store = BudgetStore(path)
+    try:
+        rows = []
+        for key in store.month_keys():
+            month_name, month_year = split_key(key)
+            if (year is not None and month_year != year) or (month is not None and month_name != month):
+                continue
+            summary = store.month_summary(month_name, month_year)
+            for category, super_category, projected, actual in summary["categories"]:
+                rows.append([path, month_year, month_name, "category", category, super_category,
+                             projected, actual, projected - actual, None])
+            for super_category, allocation in summary["allocation"].items():
+                projected, actual = store.get_super_category_total(month_name, month_year, super_category)
+                rows.append([path, month_year, month_name, "super_category", super_category, super_category,
+                             projected, actual, projected - actual, allocation])
+            rows.append([path, month_year, month_name, "month", "TOTAL", None,
+                         summary["projected"], summary["actual"], summary["difference"], None])
+        return rows
+    finally:
+        store.close()
+
+def _report_or_error(path, year, month):
+    """Run report_file in a worker, returning (path, rows, error) so one bad file does not stop the rest."""
+    try:
+        return path, report_file(path, year, month), None
+    except Exception as error:
+        return path, None, f"{type(error).__name__}: {error}"
+
+def run_report(paths, output, output_format="csv", jobs=None, year=None, month=None):
+    """Write the report for many budget files to an open text file and return how many files failed.
+
+    Files are spread over a pool of jobs worker processes (one per CPU by
+    default); jobs=1 runs everything in this process. Rows come out in the
+    order the files were given, each file's rows written as soon as they and
+    every earlier file's are ready.
+    """
+    paths = find_budgets(paths)
+    failures = 0
+    writer = _CsvWriter(output) if output_format == "csv" else _JsonWriter(output)
+    if jobs == 1:
+        results = map(_report_or_error, paths, repeat(year), repeat(month))
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        # Several files per task keeps the per-task overhead small when there are hundreds of them
+        workers = jobs or os.cpu_count() or 1
+        results = executor.map(_report_or_error, paths, repeat(year), repeat(month),
+                               chunksize=max(1, len(paths) // (workers * 4)))
+    try:
+        for path, rows, error in results:
+            if error is not None:
+                print(f"{path}: {error}", file=sys.stderr)
+                failures += 1
+                continue
+            writer.write(rows)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    writer.close()
+    return failures
+
+class _CsvWriter:
+    def __init__(self, output):
+        self.writer = csv.writer(output)
+        self.writer.writerow(FIELDS)
+
+    def write(self, rows):
+        self.writer.writerows([_rounded(row) for row in rows])
+
+    def close(self):
+        pass
+
+class _JsonWriter:
+    """Streams one JSON array of row objects, so the whole report never has to be held in memory."""
+
+    def __init__(self, output):
+        self.output = output
+        self.separator = "[\n"
+
+    def write(self, rows):
+        for row in rows:
+            self.output.write(self.separator + json.dumps(dict(zip(FIELDS, _rounded(row)))))
+            self.separator = ",\n"
+
+    def close(self):
+        self.output.write("[]\n" if self.separator == "[\n" else "\n]\n")
+
+def _rounded(row):
+    """Round the money and percentage columns to what the Summary tab displays."""
+    return row[:6] + [round(value, 2) for value in row[6:9]] + [None if row[9] is None else round(row[9], 1)]
@@ -1,16 +1,43 @@
+import time
+started_at = time.perf_counter()  # Before the heavier imports, so the startup report can time them
+
+import os
 import sys
 from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
 from ui.main_window import RichvisionFamilyBudgetApp
 from data.budget_data import BudgetData
 
+def report_startup(phases):
+    """Print how long each startup phase took, given (name, finished at) pairs in order."""
+    previous = started_at
+    lines = ["Startup timings:"]
+    for name, finished_at in phases:
+        lines.append(f"  {name:<12} {(finished_at - previous) * 1000:8.1f} ms")
+        previous = finished_at
+    lines.append(f"  {'total':<12} {(previous - started_at) * 1000:8.1f} ms")
+    print("\n".join(lines), file=sys.stderr)
+
 if __name__ == "__main__":
+    phases = [("imports", time.perf_counter())]
     app = QApplication(sys.argv)
 
     # Initialize budget data
-    budget_data = BudgetData()
+    # An optional path picks the data file; a .db path selects the SQLite backend and
+    # a .shards path a directory of per-year shards, and a .fbin path a binary snapshot
+    budget_data = BudgetData(*sys.argv[1:2])
+    phases.append(("data load", time.perf_counter()))
+    # Write out any debounced changes before the process exits
+    app.aboutToQuit.connect(budget_data.close)
 
     # Create and show the main window
     window = RichvisionFamilyBudgetApp(budget_data)
     window.show()
+    phases.append(("window", time.perf_counter()))
+
+    # Set FAMILYBUDGET_STARTUP_TIMINGS=1 to see where startup time goes
+    if os.environ.get("FAMILYBUDGET_STARTUP_TIMINGS"):
+        # Zero-delay timers run once the event loop has processed the first paint
+        QTimer.singleShot(0, lambda: report_startup(phases + [("first paint", time.perf_counter())]))
 
     sys.exit(app.exec_())
\ No newline at end of file
@@ -1,16 +1,25 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QComboBox, QSpinBox
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel, QComboBox, QSpinBox, QSizePolicy
 from PyQt5.QtGui import QFont
-from PyQt5.QtCore import Qt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+from PyQt5.QtCore import Qt, QTimer
+
+from data.analytics import BudgetFrame
+from utils.charts import MONTH, TREND_RESOLUTIONS, ChartRenderer
+from utils.instrumentation import timed
 
 class AnalysisPage(QWidget):
     def __init__(self, budget_data):
         super().__init__()
         self.budget_data = budget_data
+        self.analytics = BudgetFrame(budget_data)  # Vectorized views over the budget
+        self.renderer = ChartRenderer(budget_data, self.analytics)  # Renders charts off the GUI thread
+        self.renderer.chart_ready.connect(self.show_chart)
+        QApplication.instance().aboutToQuit.connect(self.renderer.shutdown)
         self.current_month = "January"  # Default month
         self.current_year = 2025  # Default year
+        self.current_resolution = MONTH  # Bucket size of the trends chart
+        self.stale = True  # Charts are out of date; set while the tab is hidden
         self.init_ui()
+        self.budget_data.data_changed.connect(self.refresh_if_visible)
 
     def init_ui(self):
         """Initialize the UI for the Analysis Page."""
@@ -36,13 +45,25 @@ class AnalysisPage(QWidget):
         title_label.setAlignment(Qt.AlignCenter)
         self.layout.addWidget(title_label)
 
-        # Add the Monthly Trends Chart
-        self.monthly_trends_chart = self.create_monthly_trends_chart()
-        self.layout.addWidget(self.monthly_trends_chart)
+        # Resolution of the trends chart, from months up to decades
+        self.resolution_selector = QComboBox()
+        for resolution, (name, _) in TREND_RESOLUTIONS.items():
+            self.resolution_selector.addItem(name, resolution)
+        self.resolution_selector.currentIndexChanged.connect(self.change_resolution)
+        self.layout.addWidget(self.resolution_selector)
 
-        # Add the Category Performance Chart
-        self.category_chart = self.create_category_chart()
+        # Charts are rendered by utils.charts and shown as images
+        self.monthly_trends_chart = self.create_chart_view()
+        self.layout.addWidget(self.monthly_trends_chart)
+        self.category_chart = self.create_chart_view()
         self.layout.addWidget(self.category_chart)
+        self.chart_views = {"trends": self.monthly_trends_chart, "categories": self.category_chart}
+
+        # Re-render once a resize has settled rather than at every intermediate size
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(100)
+        self.resize_timer.timeout.connect(self.refresh_if_visible)
 
         # Set the layout
         self.setLayout(self.layout)
@@ -50,83 +71,74 @@ class AnalysisPage(QWidget):
     def change_month(self, month):
         """Change the current month and refresh the UI."""
         self.current_month = month
-        self.refresh_ui()
+        if self.isVisible():
+            self.update_category_chart()  # The trends chart covers the whole year
+        else:
+            self.stale = True
+
+    def change_resolution(self, index):
+        """Change the trends chart's resolution and refresh it."""
+        self.current_resolution = self.resolution_selector.itemData(index)
+        if self.isVisible():
+            self.update_monthly_trends_chart()
+        else:
+            self.stale = True
 
     def change_year(self, year):
         """Change the current year and refresh the UI."""
         self.current_year = year
-        self.refresh_ui()
-
-    def create_monthly_trends_chart(self):
-        """Create a chart showing projected vs. actual costs per month."""
-        figure = Figure()
-        canvas = FigureCanvas(figure)
-        ax = figure.add_subplot(111)
-
-        # Get actual data from budget_data
-        months = list(self.budget_data.data.keys())
-        if not months:
-            ax.text(0.5, 0.5, "No data available", ha="center", va="center", fontsize=14, fontweight="bold")
-            return canvas
-
-        projected = [sum(self.budget_data.get_category_total(month.split('_')[0], month.split('_')[1], category)[0] for category in self.budget_data.get_data(month.split('_')[0], month.split('_')[1])["categories"]) for month in months]
-        actual = [sum(self.budget_data.get_category_total(month.split('_')[0], month.split('_')[1], category)[1] for category in self.budget_data.get_data(month.split('_')[0], month.split('_')[1])["categories"]) for month in months]
-
-        # Plot the data
-        x = range(len(months))
-        ax.plot(x, projected, label="Projected Cost", marker="o", color="blue", linewidth=2)
-        ax.plot(x, actual, label="Actual Cost", marker="o", color="green", linewidth=2)
-
-        # Customize the chart
-        ax.set_xticks(x)
-        ax.set_xticklabels(months, rotation=45, ha="right")
-        ax.set_xlabel("Month", fontsize=12)
-        ax.set_ylabel("Cost ($)", fontsize=12)
-        ax.set_title("Monthly Trends (Projected vs. Actual)", fontsize=14, fontweight="bold")
-        ax.legend()
-        ax.grid(True, linestyle="--", alpha=0.6)
-
-        return canvas
-
-    def create_category_chart(self):
-        """Create the Category Performance Chart."""
-        figure = Figure()
-        canvas = FigureCanvas(figure)
-        ax = figure.add_subplot(111)
-
-        # Get actual data from budget_data
-        categories = list(set(cat for month_data in self.budget_data.data.values() for cat in month_data["categories"].keys()))
-        if not categories:
-            ax.text(0.5, 0.5, "No data available", ha="center", va="center", fontsize=14, fontweight="bold")
-            return canvas
-
-        projected = [sum(self.budget_data.get_category_total(month.split('_')[0], month.split('_')[1], category)[0] for month in self.budget_data.data.keys()) for category in categories]
-        actual = [sum(self.budget_data.get_category_total(month.split('_')[0], month.split('_')[1], category)[1] for month in self.budget_data.data.keys()) for category in categories]
-
-        # Plot the data
-        x = range(len(categories))
-        ax.bar(x, projected, width=0.4, label="Projected Cost", align="center", color="blue", alpha=0.7)
-        ax.bar([i + 0.4 for i in x], actual, width=0.4, label="Actual Cost", align="center", color="green", alpha=0.7)
-
-        # Customize the chart
-        ax.set_xticks([i + 0.2 for i in x])
-        ax.set_xticklabels(categories, rotation=45, ha="right")
-        ax.set_xlabel("Category", fontsize=12)
-        ax.set_ylabel("Cost ($)", fontsize=12)
-        ax.set_title("Category Performance (Projected vs. Actual)", fontsize=14, fontweight="bold")
-        ax.legend()
-        ax.grid(True, linestyle="--", alpha=0.6)
-
-        return canvas
-
+        self.refresh_if_visible()
+
+    def refresh_if_visible(self):
+        """Redraw now if the tab is on screen, otherwise when it is next shown."""
+        if self.isVisible():
+            self.refresh_ui()
+        else:
+            self.stale = True
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.stale:
+            self.refresh_ui()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resize_timer.start()
+
+    def create_chart_view(self):
+        """Create a label that displays a rendered chart at whatever size the layout gives it."""
+        view = QLabel()
+        view.setAlignment(Qt.AlignCenter)
+        view.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)  # Pixmaps must not drive the layout
+        view.setMinimumSize(200, 150)
+        view.setStyleSheet("color: white;")  # For the placeholder text
+        return view
+
+    @timed()
+    def update_monthly_trends_chart(self):
+        """Show the trends up to the selected year at the selected resolution."""
+        view = self.monthly_trends_chart
+        self.show_chart("trends", self.renderer.trends(self.current_resolution, self.current_year, view.width(), view.height()))
+
+    @timed()
+    def update_category_chart(self):
+        """Show the selected month's category performance."""
+        view = self.category_chart
+        self.show_chart("categories", self.renderer.categories(self.current_month, self.current_year, view.width(), view.height()))
+
+    def show_chart(self, kind, pixmap):
+        """Display a rendered chart, or a placeholder while it is being rendered."""
+        view = self.chart_views[kind]
+        if pixmap is None:
+            view.setText("Rendering chart...")
+        elif pixmap.isNull():
+            view.setText("Chart could not be rendered")
+        else:
+            view.setPixmap(pixmap)
+
+    @timed()
     def refresh_ui(self):
         """Refresh the UI to reflect changes."""
-        self.layout.removeWidget(self.monthly_trends_chart)
-        self.monthly_trends_chart.deleteLater()
-        self.layout.removeWidget(self.category_chart)
-        self.category_chart.deleteLater()
-
-        self.monthly_trends_chart = self.create_monthly_trends_chart()
-        self.layout.addWidget(self.monthly_trends_chart)
-        self.category_chart = self.create_category_chart()
-        self.layout.addWidget(self.category_chart)
\ No newline at end of file
+        self.stale = False
+        self.update_monthly_trends_chart()
+        self.update_category_chart()
@@ -0,0 +1,119 @@
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
+    QFileDialog, QMessageBox
+)
+from PyQt5.QtGui import QFont
+from PyQt5.QtCore import Qt, QTimer
+
+from utils.instrumentation import registry
+
+class DiagnosticsPage(QWidget):
+    """Latencies and counters collected by utils.instrumentation, with cProfile and Chrome trace export."""
+
+    TIMER_HEADERS = ["Function", "Calls", "p50 (ms)", "p95 (ms)", "Max (ms)", "Total (ms)"]
+
+    def __init__(self, budget_data):
+        super().__init__()
+        self.budget_data = budget_data
+        self.init_ui()
+
+    def init_ui(self):
+        """Initialize the UI for the Diagnostics Page."""
+        self.layout = QVBoxLayout()
+
+        # Title label
+        title_label = QLabel("Diagnostics")
+        title_label.setFont(QFont("Arial", 16, QFont.Bold))
+        title_label.setStyleSheet("color: white;")
+        title_label.setAlignment(Qt.AlignCenter)
+        self.layout.addWidget(title_label)
+
+        # Per-function latencies
+        self.timer_table = QTableWidget(0, len(self.TIMER_HEADERS))
+        self.timer_table.setHorizontalHeaderLabels(self.TIMER_HEADERS)
+        self.timer_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.timer_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.timer_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.timer_table.setStyleSheet("background-color: white; color: black;")
+        self.layout.addWidget(self.timer_table, 3)
+
+        # Counters such as bytes written and chart cache hits
+        self.counter_table = QTableWidget(0, 2)
+        self.counter_table.setHorizontalHeaderLabels(["Counter", "Value"])
+        self.counter_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.counter_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.counter_table.setStyleSheet("background-color: white; color: black;")
+        self.layout.addWidget(self.counter_table, 1)
+
+        # Buttons
+        button_layout = QHBoxLayout()
+        button_style = "background-color: #0078D7; color: white; padding: 10px;"
+        self.reset_button = QPushButton("Reset")
+        self.reset_button.clicked.connect(self.reset)
+        self.profile_button = QPushButton("Start cProfile")
+        self.profile_button.clicked.connect(self.toggle_profile)
+        self.trace_button = QPushButton("Save Chrome Trace")
+        self.trace_button.clicked.connect(self.save_trace)
+        for button in (self.reset_button, self.profile_button, self.trace_button):
+            button.setStyleSheet(button_style)
+            button_layout.addWidget(button)
+        self.layout.addLayout(button_layout)
+
+        # Refresh the tables while the tab is on screen
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh_ui)
+
+        # Set the layout
+        self.setLayout(self.layout)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh_ui()
+        self.refresh_timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.refresh_timer.stop()
+
+    def refresh_ui(self):
+        """Show the latest timers and counters."""
+        self.fill_table(self.timer_table, [
+            (name, str(calls), f"{p50:.3f}", f"{p95:.3f}", f"{longest:.3f}", f"{total:.1f}")
+            for name, calls, p50, p95, longest, total in registry.timer_rows()
+        ])
+        self.fill_table(self.counter_table, [(name, f"{value:,}") for name, value in registry.counter_rows()])
+
+    def fill_table(self, table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column > 0:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row, column, item)
+
+    def reset(self):
+        """Clear the timers, counters and trace."""
+        registry.reset()
+        self.refresh_ui()
+
+    def toggle_profile(self):
+        """Start cProfile, or stop it and save what it recorded."""
+        if registry.profiler is None:
+            registry.start_profile()
+            self.profile_button.setText("Stop cProfile and Save")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save cProfile Statistics", "familybudget.prof",
+                                              "cProfile statistics (*.prof)")
+        self.profile_button.setText("Start cProfile")
+        registry.stop_profile(path or None)  # Cancelling the dialog discards the profile
+
+    def save_trace(self):
+        """Save the recorded calls as a Chrome trace."""
+        path, _ = QFileDialog.getSaveFileName(self, "Save Chrome Trace", "familybudget.trace.json",
+                                              "Chrome trace (*.json)")
+        if not path:
+            return
+        events = registry.save_trace(path)
+        QMessageBox.information(self, "Trace Saved", f"Saved {events} calls. Open the file in chrome://tracing or Perfetto.")
@@ -1,9 +1,14 @@
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QScrollArea, QMessageBox, QInputDialog, QComboBox, QSpinBox
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QMessageBox, QInputDialog, QComboBox, QSpinBox, QTreeView, QHeaderView,
+    QFileDialog, QProgressDialog
 )
-from PyQt5.QtGui import QFont
 from PyQt5.QtCore import Qt
 
+from data.categorizer import Categorizer, rules_path
+from data.importer import StatementError, import_file
+from ui.models import CostDelegate, ExpenseTreeModel
+from utils.instrumentation import timed
+
 class InputPage(QWidget):
     def __init__(self, budget_data):
         super().__init__()
@@ -29,38 +34,56 @@ class InputPage(QWidget):
         self.year_selector.valueChanged.connect(self.change_year)
         self.layout.addWidget(self.year_selector)
 
-        # Scroll area to handle many categories
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_content = QWidget()
-        self.scroll_layout = QVBoxLayout(scroll_content)
-
-        # Add default categories
-        self.category_widgets = {}
-        self.load_categories()
+        # Expense grid: categories with their expense items, only visible rows are painted
+        self.expense_model = ExpenseTreeModel(self.budget_data, self.current_month, self.current_year)
+        self.expense_view = QTreeView()
+        self.expense_view.setModel(self.expense_model)
+        self.expense_view.setUniformRowHeights(True)
+        self.expense_view.setEditTriggers(QTreeView.DoubleClicked | QTreeView.EditKeyPressed | QTreeView.AnyKeyPressed)
+        self.expense_view.setStyleSheet("background-color: white; color: black;")
+        self.expense_view.header().setSectionResizeMode(QHeaderView.Stretch)
+        self.cost_delegate = CostDelegate(self.expense_view)
+        self.expense_view.setItemDelegateForColumn(ExpenseTreeModel.PROJECTED, self.cost_delegate)
+        self.expense_view.setItemDelegateForColumn(ExpenseTreeModel.ACTUAL, self.cost_delegate)
+        self.expense_model.modelReset.connect(self.expense_view.expandAll)
+        self.expense_view.expandAll()
 
         # Add a button to add new categories
         self.add_category_button = QPushButton("Add New Category")
         self.add_category_button.setStyleSheet("background-color: #0078D7; color: white; padding: 10px;")
         self.add_category_button.clicked.connect(self.add_new_category)
 
+        # Add a button to add expense items to the selected category
+        add_expense_button = QPushButton("Add Expense Item")
+        add_expense_button.setStyleSheet("background-color: #555; color: white; padding: 10px;")
+        add_expense_button.clicked.connect(lambda: self.add_new_expense(self.selected_category()))
+
+        # Remove the selected expense item
+        remove_button = QPushButton("Remove")
+        remove_button.setStyleSheet("background-color: #FF4444; color: white; padding: 10px;")
+        remove_button.clicked.connect(self.remove_selected_expense)
+
+        # Import a bank statement into the actual costs
+        import_button = QPushButton("Import Statement")
+        import_button.setStyleSheet("background-color: #555; color: white; padding: 10px;")
+        import_button.clicked.connect(self.import_statement)
+
         # Save button
         save_button = QPushButton("Save Data")
         save_button.setStyleSheet("background-color: #4CAF50; color: white; padding: 10px;")
         save_button.clicked.connect(self.save_data)
 
         # Add widgets to the layout
-        scroll_area.setWidget(scroll_content)
-        self.layout.addWidget(scroll_area)
-        self.layout.addWidget(self.add_category_button)
+        button_row = QHBoxLayout()
+        button_row.addWidget(self.add_category_button)
+        button_row.addWidget(add_expense_button)
+        button_row.addWidget(remove_button)
+        button_row.addWidget(import_button)
+        self.layout.addWidget(self.expense_view)
+        self.layout.addLayout(button_row)
         self.layout.addWidget(save_button)
         self.setLayout(self.layout)
 
-    def load_categories(self):
-        """Load categories from the budget data."""
-        for category in self.budget_data.get_data(self.current_month, self.current_year)["categories"]:
-            self.add_category_section(category)
-
     def change_month(self, month):
         """Change the current month and refresh the UI."""
         self.current_month = month
@@ -71,103 +94,9 @@ class InputPage(QWidget):
         self.current_year = year
         self.refresh_ui()
 
-    def add_category_section(self, category):
-        """Add a section for a category with its expense items."""
-        category_layout = QVBoxLayout()
-
-        # Category label
-        category_label = QLabel(category)
-        category_label.setFont(QFont("Arial", 14, QFont.Bold))
-        category_label.setStyleSheet("color: #00008B;")  # Dark blue color
-        category_layout.addWidget(category_label)
-
-        # Add expense items
-        for expense_item in self.budget_data.get_data(self.current_month, self.current_year)["categories"][category]["expenses"]:
-            self.add_expense_row(category, expense_item, category_layout)
-
-        # Add a button to add new expense items
-        add_expense_button = QPushButton(f"Add Expense Item to {category}")
-        add_expense_button.setStyleSheet("background-color: #555; color: white; padding: 5px;")
-        add_expense_button.clicked.connect(lambda: self.add_new_expense(category))
-        category_layout.addWidget(add_expense_button)
-
-        # Add a separator line
-        separator = QLabel("——————————————————————————")
-        separator.setStyleSheet("color: #555;")  # Gray color
-        category_layout.addWidget(separator)
-
-        # Add the category section to the scroll layout
-        self.scroll_layout.addLayout(category_layout)
-
-    def add_expense_row(self, category, expense_item, layout):
-        """Add a row for an expense item under a category."""
-        row_layout = QHBoxLayout()
-
-        # Expense item label
-        expense_label = QLabel(expense_item)
-        expense_label.setFont(QFont("Arial", 12))
-        expense_label.setStyleSheet("color: #00008B;")  # Dark blue color
-        expense_label.setFixedWidth(250)  # Wider column for the expense item label
-
-        # Projected cost input
-        projected_input = QLineEdit()
-        projected_input.setPlaceholderText("Projected Cost")
-        projected_input.setStyleSheet("background-color: white; color: black; padding: 5px;")
-        projected_input.setFixedWidth(150)
-        projected_input.textChanged.connect(lambda: self.update_cost_difference(category, expense_item))
-
-        # Actual cost input
-        actual_input = QLineEdit()
-        actual_input.setPlaceholderText("Actual Cost")
-        actual_input.setStyleSheet("background-color: white; color: black; padding: 5px;")
-        actual_input.setFixedWidth(150)
-        actual_input.textChanged.connect(lambda: self.update_cost_difference(category, expense_item))
-
-        # Cost Difference label
-        cost_difference_label = QLabel("0")
-        cost_difference_label.setFont(QFont("Arial", 12))
-        cost_difference_label.setStyleSheet("color: #00008B;")  # Dark blue color
-        cost_difference_label.setFixedWidth(150)
-        cost_difference_label.setAlignment(Qt.AlignCenter)
-
-        # Remove button
-        remove_button = QPushButton("Remove")
-        remove_button.setStyleSheet("background-color: #FF4444; color: white; padding: 5px;")
-        remove_button.setFixedWidth(80)  # Smaller width for the Remove button
-        remove_button.clicked.connect(lambda: self.remove_expense(category, expense_item))
-
-        # Add widgets to the row layout
-        row_layout.addWidget(expense_label)
-        row_layout.addWidget(projected_input)
-        row_layout.addWidget(actual_input)
-        row_layout.addWidget(cost_difference_label)
-        row_layout.addWidget(remove_button)
-
-        # Add row to the category layout
-        layout.addLayout(row_layout)
-
-        # Store the input widgets for later access
-        self.category_widgets[(category, expense_item)] = {
-            "projected_input": projected_input,
-            "actual_input": actual_input,
-            "cost_difference_label": cost_difference_label,
-        }
-
-        # Set initial values for projected and actual costs
-        projected_value = self.budget_data.get_data(self.current_month, self.current_year)["categories"][category]["expenses"][expense_item]["projected"]
-        actual_value = self.budget_data.get_data(self.current_month, self.current_year)["categories"][category]["expenses"][expense_item]["actual"]
-        projected_input.setText(str(projected_value))
-        actual_input.setText(str(actual_value))
-        self.update_cost_difference(category, expense_item)
-
-    def update_cost_difference(self, category, expense_item):
-        """Update the Cost Difference when Projected or Actual Cost changes."""
-        widgets = self.category_widgets.get((category, expense_item))
-        if widgets:
-            projected = float(widgets["projected_input"].text() or 0)
-            actual = float(widgets["actual_input"].text() or 0)
-            difference = projected - actual
-            widgets["cost_difference_label"].setText(f"{difference:.2f}")
+    def selected_category(self):
+        """Return the category of the selected row, or None if nothing is selected."""
+        return self.expense_model.category_at(self.expense_view.currentIndex())
 
     def add_new_category(self):
         """Add a new category."""
@@ -178,49 +107,88 @@ class InputPage(QWidget):
             )
             if ok:
                 self.budget_data.add_category(self.current_month, self.current_year, new_category, super_category)
-                self.add_category_section(new_category)
 
     def add_new_expense(self, category):
         """Add a new expense item under a category."""
-        new_expense, ok = QInputDialog.getText(self, "Add New Expense Item", "Enter expense item name:")
+        if category is None:
+            QMessageBox.information(self, "Add Expense Item", "Select a category first.")
+            return
+        new_expense, ok = QInputDialog.getText(self, "Add New Expense Item", f"Enter expense item name for {category}:")
         if ok and new_expense:
             self.budget_data.add_expense(self.current_month, self.current_year, category, new_expense)
-            self.add_expense_row(category, new_expense, self.scroll_layout.itemAt(self.scroll_layout.count() - 1).layout())
+
+    def remove_selected_expense(self):
+        """Remove the selected expense item."""
+        index = self.expense_view.currentIndex()
+        expense_item = self.expense_model.expense_item_at(index)
+        if expense_item is not None:
+            self.remove_expense(self.expense_model.category_at(index), expense_item)
 
     def remove_expense(self, category, expense_item):
         """Remove an expense item from a category."""
         self.budget_data.remove_expense(self.current_month, self.current_year, category, expense_item)
-        self.refresh_ui()
 
+    def import_statement(self):
+        """Preview a bank statement (CSV, OFX or QFX), then add its expenses to the budget."""
+        path, _ = QFileDialog.getOpenFileName(self, "Import Statement", "", "Bank statements (*.csv *.ofx *.qfx);;All files (*)")
+        if not path:
+            return
+        try:
+            preview = self.run_import(path, "Reading statement...", dry_run=True)
+            if preview is None:
+                return
+            if not preview.imported:
+                QMessageBox.information(self, "Import Statement", preview.describe())
+                return
+            answer = QMessageBox.question(self, "Import Statement", preview.describe() + "\n\nImport these transactions?")
+            if answer != QMessageBox.Yes:
+                return
+            summary = self.run_import(path, "Importing statement...")
+        except (OSError, StatementError) as error:
+            QMessageBox.warning(self, "Error", f"The statement could not be imported:\n{error}")
+            return
+        if summary is not None:
+            QMessageBox.information(self, "Success", summary.describe())
+
+    @timed()
+    def run_import(self, path, label, dry_run=False):
+        """Run import_file behind a progress dialog. Returns None if the user cancelled."""
+        # Transactions are placed by the budget's categorization rules, if it has any
+        rules_file = rules_path(self.budget_data.data_file)
+        categorizer = Categorizer.load(rules_file)
+        categorizer.learn(self.budget_data.assignments())  # Picks up transactions moved since the last import
+        dialog = QProgressDialog(label, "Cancel", 0, 1000, self)
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(300)
+
+        def progress(rows, bytes_read, total_bytes):
+            dialog.setValue(int(1000 * bytes_read / max(total_bytes, 1)))  # Also keeps the window responsive
+            if dialog.wasCanceled():
+                raise _ImportCancelled()
+
+        try:
+            summary = import_file(self.budget_data, path, categorizer.categorize, dry_run=dry_run, progress=progress,
+                                  placed=categorizer.placed)
+            if not dry_run and (categorizer.learned or categorizer.guessed):
+                categorizer.save(rules_file)  # Keep the learned fallback and which transactions it placed
+            return summary
+        except _ImportCancelled:
+            return None  # The import batch is rolled back, so nothing is committed
+        finally:
+            dialog.close()
+
+    @timed()
     def refresh_ui(self):
         """Refresh the UI to reflect changes."""
-        # Clear the scroll layout
-        while self.scroll_layout.count():
-            item = self.scroll_layout.takeAt(0)  # Take the first item
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()  # Delete the widget if it exists
-
-        # Rebuild the UI with updated data
-        self.category_widgets = {}
-        self.load_categories()
+        self.expense_model.set_period(self.current_month, self.current_year)
 
     def save_data(self):
-        """Save the entered data to the budget data object."""
-        for category in self.budget_data.get_data(self.current_month, self.current_year)["categories"]:
-            for expense_item in self.budget_data.get_data(self.current_month, self.current_year)["categories"][category]["expenses"]:
-                projected = float(self.get_input_value(category, expense_item, "projected"))
-                actual = float(self.get_input_value(category, expense_item, "actual"))
-                self.budget_data.update_expense(self.current_month, self.current_year, category, expense_item, projected, actual)
-        QMessageBox.information(self, "Success", "Data saved successfully!")
-        self.budget_data.data_changed.emit()  # Emit the signal after saving data
-
-    def get_input_value(self, category, expense_item, field):
-        """Get the value from the input field for a specific expense item."""
-        widgets = self.category_widgets.get((category, expense_item))
-        if widgets:
-            if field == "projected":
-                return widgets["projected_input"].text() or "0"
-            elif field == "actual":
-                return widgets["actual_input"].text() or "0"
-        return "0"
\ No newline at end of file
+        """Make sure every edit has reached the disk."""
+        # Edits are committed to the budget data as soon as a cell is changed
+        if self.budget_data.flush():
+            QMessageBox.information(self, "Success", "Data saved successfully!")
+        else:
+            QMessageBox.warning(self, "Error", "Some changes could not be written to disk.")
+
+class _ImportCancelled(Exception):
+    """Raised from the progress callback to stop an import."""
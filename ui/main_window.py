@@ -1,12 +1,13 @@
 import sys
 from PyQt5.QtWidgets import QMainWindow, QTabWidget, QWidget, QVBoxLayout, QLabel
-from PyQt5.QtGui import QColor, QLinearGradient, QPalette, QFont
+from PyQt5.QtGui import QColor, QLinearGradient, QPalette, QFont, QKeySequence
 from PyQt5.QtCore import Qt
 
-# Import the InputPage, SummaryPage, and AnalysisPage
+# Import the InputPage and SummaryPage; AnalysisPage pulls in matplotlib and pandas,
+# so it is imported when its tab is first opened
 from ui.input_page import InputPage
 from ui.summary_page import SummaryPage
-from ui.analysis_page import AnalysisPage
+from utils import instrumentation
 
 class RichvisionFamilyBudgetApp(QMainWindow):
     def __init__(self, budget_data):
@@ -25,10 +26,24 @@ class RichvisionFamilyBudgetApp(QMainWindow):
         # Style the tab widget
         self.style_tab_widget()
 
-        # Add tabs
-        self.tabs.addTab(self.create_input_page(), "Input")
-        self.tabs.addTab(self.create_summary_page(), "Summary")
-        self.tabs.addTab(self.create_analysis_page(), "Analysis")
+        # Add tabs; each page is built the first time its tab is shown
+        self.page_factories = [self.create_input_page, self.create_summary_page, self.create_analysis_page]
+        titles = ["Input", "Summary", "Analysis"]
+        # The Diagnostics tab is only there when FAMILYBUDGET_INSTRUMENT is set
+        if instrumentation.ENABLED:
+            self.page_factories.append(self.create_diagnostics_page)
+            titles.append("Diagnostics")
+        self.pages = {}  # Tab index -> page, for the pages built so far
+        for title in titles:
+            container = QWidget()
+            container_layout = QVBoxLayout(container)
+            container_layout.setContentsMargins(0, 0, 0, 0)
+            self.tabs.addTab(container, title)
+        self.tabs.currentChanged.connect(self.build_page)
+        self.build_page(self.tabs.currentIndex())
+
+        # Undo and redo from any tab
+        self.add_undo_actions()
 
     def set_background_gradient(self):
         """Set a gradient background for the main window."""
@@ -70,6 +85,26 @@ class RichvisionFamilyBudgetApp(QMainWindow):
             }
         """)
 
+    def add_undo_actions(self):
+        """Add Ctrl+Z and Ctrl+Y (or the platform's own keys) for the budget's undo history."""
+        undo_stack = self.budget_data.undo_stack
+        self.undo_action = undo_stack.createUndoAction(self, "&Undo")
+        self.undo_action.setShortcuts(QKeySequence.Undo)
+        self.redo_action = undo_stack.createRedoAction(self, "&Redo")
+        redo_keys = QKeySequence.keyBindings(QKeySequence.Redo)
+        if QKeySequence("Ctrl+Y") not in redo_keys:
+            redo_keys.append(QKeySequence("Ctrl+Y"))  # Not a redo key on every platform
+        self.redo_action.setShortcuts(redo_keys)
+        self.addActions([self.undo_action, self.redo_action])
+
+    def build_page(self, index):
+        """Build the page for a tab if it has not been built yet."""
+        if index < 0 or index in self.pages:
+            return
+        page = self.page_factories[index]()
+        self.pages[index] = page
+        self.tabs.widget(index).layout().addWidget(page)
+
     def create_input_page(self):
         """Create the Input tab."""
         return InputPage(self.budget_data)
@@ -80,4 +115,10 @@ class RichvisionFamilyBudgetApp(QMainWindow):
 
     def create_analysis_page(self):
         """Create the Analysis tab."""
-        return AnalysisPage(self.budget_data)
\ No newline at end of file
+        from ui.analysis_page import AnalysisPage
+        return AnalysisPage(self.budget_data)
+
+    def create_diagnostics_page(self):
+        """Create the Diagnostics tab."""
+        from ui.diagnostics_page import DiagnosticsPage
+        return DiagnosticsPage(self.budget_data)
\ No newline at end of file
@@ -0,0 +1,256 @@
+from PyQt5.QtWidgets import QStyledItemDelegate, QDoubleSpinBox
+from PyQt5.QtGui import QColor, QFont
+from PyQt5.QtCore import QAbstractItemModel, QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+
+class ExpenseTreeModel(QAbstractItemModel):
+    """Categories and their expense items for one month, read straight from BudgetData.
+
+    Top-level rows are categories and their children are expense items. Only
+    the category and item names are cached; every value is looked up on demand,
+    so the view only ever touches the rows it is painting.
+    """
+
+    HEADERS = ["Expense Item", "Projected Cost", "Actual Cost", "Cost Difference"]
+    PROJECTED, ACTUAL, DIFFERENCE = 1, 2, 3
+
+    def __init__(self, budget_data, month, year):
+        super().__init__()
+        self.budget_data = budget_data
+        self.month = month
+        self.year = year
+        self.category_font = QFont("Arial", 14, QFont.Bold)
+        self.item_font = QFont("Arial", 12)
+        self.text_color = QColor("#00008B")  # Dark blue color
+        self.categories = []  # Category names in display order
+        self.items = []  # Expense item names for each category row
+        self._load()
+        self.budget_data.item_changed.connect(self.on_item_changed)
+
+    def set_period(self, month, year):
+        """Show a different month. This is a model reset, not a widget rebuild."""
+        self.beginResetModel()
+        self.month = month
+        self.year = year
+        self._load()
+        self.endResetModel()
+
+    def _load(self):
+        month_data = self.budget_data.get_data(self.month, self.year)
+        self.categories = list(month_data.categories)
+        self.items = [list(month_data.categories[category].expenses) for category in self.categories]
+
+    def on_item_changed(self, month, year, category, expense_item, kind):
+        """Repaint the changed row, or reset if rows were added or removed."""
+        if month != self.month or year != self.year:
+            return
+        if kind != "updated" or not expense_item or category not in self.categories:
+            self.set_period(self.month, self.year)
+            return
+        category_row = self.categories.index(category)
+        items = self.items[category_row]
+        if expense_item not in items:
+            self.set_period(self.month, self.year)
+            return
+        parent = self.index(category_row, 0)
+        item_row = items.index(expense_item)
+        self.dataChanged.emit(self.index(item_row, self.PROJECTED, parent), self.index(item_row, self.DIFFERENCE, parent))
+        self.dataChanged.emit(self.index(category_row, self.PROJECTED), self.index(category_row, self.DIFFERENCE))
+
+    def category_at(self, index):
+        """Return the category an index belongs to, or None for an invalid index."""
+        if not index.isValid():
+            return None
+        if index.internalId() == 0:
+            return self.categories[index.row()]
+        return self.categories[index.internalId() - 1]
+
+    def expense_item_at(self, index):
+        """Return the expense item name for an item row, or None for a category row."""
+        if not index.isValid() or index.internalId() == 0:
+            return None
+        return self.items[index.internalId() - 1][index.row()]
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if parent.isValid():
+            return self.createIndex(row, column, parent.row() + 1)  # Items remember their category row
+        return self.createIndex(row, column, 0)
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.categories)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return len(self.items[parent.row()])
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.internalId() != 0 and index.column() in (self.PROJECTED, self.ACTUAL):
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role == Qt.ForegroundRole:
+            return self.text_color
+        if role == Qt.TextAlignmentRole and column:
+            return Qt.AlignCenter
+        category = self.category_at(index)
+        expense_item = self.expense_item_at(index)
+        if expense_item is None:
+            if role == Qt.FontRole:
+                return self.category_font
+            if role != Qt.DisplayRole:
+                return None
+            if column == 0:
+                return category
+            projected, actual = self.budget_data.get_category_total(self.month, self.year, category)
+            return self._format(column, projected, actual)
+        if role == Qt.FontRole:
+            return self.item_font
+        if column == 0:
+            return expense_item if role == Qt.DisplayRole else None
+        expense = self.budget_data.get_data(self.month, self.year).categories[category].expenses[expense_item]
+        if role == Qt.EditRole and column != self.DIFFERENCE:
+            return float(expense.projected if column == self.PROJECTED else expense.actual)
+        if role == Qt.DisplayRole:
+            return self._format(column, expense.projected, expense.actual)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not self.flags(index) & Qt.ItemIsEditable:
+            return False
+        category = self.category_at(index)
+        expense_item = self.expense_item_at(index)
+        expense = self.budget_data.get_data(self.month, self.year).categories[category].expenses[expense_item]
+        projected = float(value) if index.column() == self.PROJECTED else expense.projected
+        actual = float(value) if index.column() == self.ACTUAL else expense.actual
+        if (projected, actual) == (expense.projected, expense.actual):
+            return True
+        # BudgetData announces the change through item_changed, which repaints the row
+        self.budget_data.update_expense(self.month, self.year, category, expense_item, projected, actual)
+        return True
+
+    def _format(self, column, projected, actual):
+        if column == self.PROJECTED:
+            return f"{projected:.2f}"
+        if column == self.ACTUAL:
+            return f"{actual:.2f}"
+        return f"{projected - actual:.2f}"
+
+class SummaryTableModel(QAbstractTableModel):
+    """One row per category of a month, with totals read from BudgetData's aggregate cache.
+
+    The month-wide totals shown under the table are computed here too, once per
+    change, so the table and the footer always agree.
+    """
+
+    HEADERS = ["Category", "Projected Cost", "Actual Cost", "Difference", "Super Category"]
+    SORT_ROLE = Qt.UserRole  # Raw values, so the proxy sorts numbers numerically
+
+    # Emitted after self.totals has been recomputed
+    totals_changed = pyqtSignal()
+
+    def __init__(self, budget_data, month, year):
+        super().__init__()
+        self.budget_data = budget_data
+        self.month = month
+        self.year = year
+        self.categories = []  # Category names in display order
+        self.super_categories = []  # Super category of each row
+        self.totals = {}
+        self._load()
+        self.budget_data.item_changed.connect(self.on_item_changed)
+
+    def set_period(self, month, year):
+        """Show a different month."""
+        self.beginResetModel()
+        self.month = month
+        self.year = year
+        self._load()
+        self.endResetModel()
+        self.totals_changed.emit()
+
+    def _load(self):
+        categories = self.budget_data.get_data(self.month, self.year).categories
+        self.categories = list(categories)
+        self.super_categories = [categories[category].super_category for category in self.categories]
+        self._compute_totals()
+
+    def _compute_totals(self):
+        # The same figures the headless report prints, so the two always agree
+        summary = self.budget_data.month_summary(self.month, self.year)
+        self.totals = {"projected": summary["projected"], "actual": summary["actual"], "difference": summary["difference"]}
+        self.totals.update(summary["allocation"])
+
+    def on_item_changed(self, month, year, category, expense_item, kind):
+        """Repaint only the row of the category that changed."""
+        if month != self.month or year != self.year:
+            return
+        if (not expense_item and kind != "updated") or category not in self.categories:
+            self.set_period(self.month, self.year)  # Rows were added or removed
+            return
+        row = self.categories.index(category)
+        self.dataChanged.emit(self.index(row, 1), self.index(row, 3))
+        self._compute_totals()
+        self.totals_changed.emit()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.categories)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, self.SORT_ROLE):
+            return None
+        row = index.row()
+        column = index.column()
+        if column == 0:
+            return self.categories[row]
+        if column == 4:
+            return self.super_categories[row]
+        projected, actual = self.budget_data.get_category_total(self.month, self.year, self.categories[row])
+        value = (projected, actual, projected - actual)[column - 1]
+        return float(value) if role == self.SORT_ROLE else f"{value:.2f}"
+
+class CostDelegate(QStyledItemDelegate):
+    """Edits cost cells with a numeric spin box instead of free text."""
+
+    def createEditor(self, parent, option, index):
+        editor = QDoubleSpinBox(parent)
+        editor.setDecimals(2)
+        editor.setRange(-1e12, 1e12)
+        editor.setButtonSymbols(QDoubleSpinBox.NoButtons)
+        editor.setStyleSheet("background-color: white; color: black;")
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setValue(index.data(Qt.EditRole) or 0)
+
+    def setModelData(self, editor, model, index):
+        editor.interpretText()
+        model.setData(index, editor.value(), Qt.EditRole)
@@ -1,6 +1,9 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem, QHeaderView, QComboBox, QSpinBox
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QTableView, QHeaderView, QComboBox, QSpinBox, QLineEdit
 from PyQt5.QtGui import QFont
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QSortFilterProxyModel
+
+from ui.models import SummaryTableModel
+from utils.instrumentation import timed
 
 class SummaryPage(QWidget):
     def __init__(self, budget_data):
@@ -10,10 +13,6 @@ class SummaryPage(QWidget):
         self.current_year = 2025  # Default year
         self.init_ui()
 
-        # Connect the data_changed signal to update the UI
-        self.budget_data.data_changed.connect(self.update_summary_table)
-        self.budget_data.data_changed.connect(self.update_summary_section)
-
     def init_ui(self):
         """Initialize the UI for the Summary Page."""
         self.layout = QVBoxLayout()
@@ -38,16 +37,30 @@ class SummaryPage(QWidget):
         title_label.setAlignment(Qt.AlignCenter)
         self.layout.addWidget(title_label)
 
+        # Filter box for the table
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter categories")
+        self.filter_input.setStyleSheet("background-color: white; color: black; padding: 5px;")
+        self.layout.addWidget(self.filter_input)
+
+        # Table model fed by the aggregate totals; the proxy sorts and filters without copying rows
+        self.summary_model = SummaryTableModel(self.budget_data, self.current_month, self.current_year)
+        self.summary_model.totals_changed.connect(self.update_summary_section)
+        self.summary_proxy = QSortFilterProxyModel(self)
+        self.summary_proxy.setSourceModel(self.summary_model)
+        self.summary_proxy.setSortRole(SummaryTableModel.SORT_ROLE)
+        self.summary_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.summary_proxy.setFilterKeyColumn(-1)  # Match the category or super category
+        self.filter_input.textChanged.connect(self.summary_proxy.setFilterFixedString)
+
         # Create a table to display the summary
-        self.summary_table = QTableWidget()
-        self.summary_table.setColumnCount(5)  # Category, Projected, Actual, Difference, Super Category
-        self.summary_table.setHorizontalHeaderLabels(["Category", "Projected Cost", "Actual Cost", "Difference", "Super Category"])
+        self.summary_table = QTableView()
+        self.summary_table.setModel(self.summary_proxy)
+        self.summary_table.setSortingEnabled(True)
+        self.summary_table.sortByColumn(-1, Qt.AscendingOrder)  # Keep the budget's own order until a header is clicked
         self.summary_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.summary_table.setStyleSheet("background-color: white; color: black;")
 
-        # Populate the table with data
-        self.update_summary_table()
-
         # Add the table to the layout
         self.layout.addWidget(self.summary_table)
 
@@ -74,59 +87,23 @@ class SummaryPage(QWidget):
         self.current_year = year
         self.refresh_ui()
 
-    def update_summary_table(self):
-        """Update the summary table with the latest data."""
-        categories = self.budget_data.get_data(self.current_month, self.current_year)["categories"]
-        self.summary_table.setRowCount(len(categories))
-
-        # Populate the table with data
-        for i, (category, data) in enumerate(categories.items()):
-            projected, actual = self.budget_data.get_category_total(self.current_month, self.current_year, category)
-            difference = projected - actual
-            super_category = data["super_category"]
-
-            # Add data to the table
-            self.summary_table.setItem(i, 0, QTableWidgetItem(category))
-            self.summary_table.setItem(i, 1, QTableWidgetItem(f"{projected:.2f}"))
-            self.summary_table.setItem(i, 2, QTableWidgetItem(f"{actual:.2f}"))
-            self.summary_table.setItem(i, 3, QTableWidgetItem(f"{difference:.2f}"))
-            self.summary_table.setItem(i, 4, QTableWidgetItem(super_category))
-
+    @timed()
     def update_summary_section(self):
-        """Update the summary section with totals and percentage allocation."""
-        # Calculate totals for all categories
-        total_projected = sum(
-            self.budget_data.get_category_total(self.current_month, self.current_year, category)[0]
-            for category in self.budget_data.get_data(self.current_month, self.current_year)["categories"]
-        )
-        total_actual = sum(
-            self.budget_data.get_category_total(self.current_month, self.current_year, category)[1]
-            for category in self.budget_data.get_data(self.current_month, self.current_year)["categories"]
-        )
-        total_difference = total_projected - total_actual
-
-        # Calculate percentage allocation for each super category
-        needs_projected, _ = self.budget_data.get_super_category_total(self.current_month, self.current_year, "NEEDS")
-        fun_projected, _ = self.budget_data.get_super_category_total(self.current_month, self.current_year, "FUN")
-        future_projected, _ = self.budget_data.get_super_category_total(self.current_month, self.current_year, "FUTURE")
-
-        needs_percentage = (needs_projected / total_projected) * 100 if total_projected != 0 else 0
-        fun_percentage = (fun_projected / total_projected) * 100 if total_projected != 0 else 0
-        future_percentage = (future_projected / total_projected) * 100 if total_projected != 0 else 0
-
-        # Update the summary section
+        """Update the summary section with the totals computed by the table model."""
+        totals = self.summary_model.totals
         self.summary_section.setText(
             f"TOTAL\n"
-            f"Projected Cost: {total_projected:.2f}\n"
-            f"Actual Cost: {total_actual:.2f}\n"
-            f"Difference: {total_difference:.2f}\n\n"
+            f"Projected Cost: {totals['projected']:.2f}\n"
+            f"Actual Cost: {totals['actual']:.2f}\n"
+            f"Difference: {totals['difference']:.2f}\n\n"
             f"PERCENTAGE ALLOCATION:\n"
-            f"NEEDS: {needs_percentage:.1f}%\n"
-            f"FUN: {fun_percentage:.1f}%\n"
-            f"FUTURE: {future_percentage:.1f}%"
+            f"NEEDS: {totals['NEEDS']:.1f}%\n"
+            f"FUN: {totals['FUN']:.1f}%\n"
+            f"FUTURE: {totals['FUTURE']:.1f}%"
         )
 
+    @timed()
     def refresh_ui(self):
         """Refresh the UI to reflect changes."""
-        self.update_summary_table()
-        self.update_summary_section()
\ No newline at end of file
+        # The model reset announces the new totals, which redraws the summary section
+        self.summary_model.set_period(self.current_month, self.current_year)
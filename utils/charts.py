@@ -1 +1,290 @@
- 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+
+from data.model import MONTHS, month_key
+from data.rollups import DECADE, QUARTER, SPANS, YEAR, bucket_label, bucket_of
+from utils.instrumentation import count, timed
+
+BAR_WIDTH = 0.4
+CACHE_SIZE = 32  # Rendered charts kept by ChartRenderer
+
+# Trend chart resolutions: (name, number of buckets shown, ending with the selected year)
+MONTH = "month"
+TREND_RESOLUTIONS = {
+    MONTH: ("Monthly", 12),
+    QUARTER: ("Quarterly", 12),
+    YEAR: ("Yearly", 12),
+    DECADE: ("Decade", 10),
+}
+
+class Chart:
+    """A matplotlib figure whose artists are created once and then fed new data."""
+
+    kind = None
+
+    def __init__(self, dpi=100):
+        self.figure = Figure(dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_ylabel("Cost ($)", fontsize=12)
+        self.title = self.ax.set_title("", fontsize=14, fontweight="bold")
+        self.empty_text = self.ax.text(0.5, 0.5, "No data available", transform=self.ax.transAxes,
+                                       ha="center", va="center", fontsize=14, fontweight="bold")
+
+    def render(self, width, height):
+        """Draw the figure at a pixel size and return it as a QImage."""
+        dpi = self.figure.dpi
+        self.figure.set_size_inches(max(width, 1) / dpi, max(height, 1) / dpi)
+        self.canvas.draw()
+        buffer = self.canvas.buffer_rgba()
+        image = QImage(buffer, buffer.shape[1], buffer.shape[0], QImage.Format_RGBA8888)
+        return image.copy()  # Detach from the canvas buffer, which the next draw reuses
+
+class TrendsChart(Chart):
+    """Projected vs. actual totals over a run of months, quarters, years or decades."""
+
+    kind = "trends"
+
+    def __init__(self, dpi=100):
+        super().__init__(dpi)
+        ax = self.ax
+
+        # One point per bucket; buckets without a budget are NaN and leave a gap in the line
+        self.projected_line, = ax.plot([], [], label="Projected Cost", marker="o", color="blue", linewidth=2)
+        self.actual_line, = ax.plot([], [], label="Actual Cost", marker="o", color="green", linewidth=2)
+
+        # Customize the chart
+        ax.legend()
+        ax.grid(True, linestyle="--", alpha=0.6)
+
+    def update(self, labels, projected, actual, title, axis_label):
+        """Move the lines to new per-bucket totals."""
+        x = np.arange(len(labels))
+        projected = np.asarray(projected, dtype=float)
+        self.projected_line.set_data(x, projected)
+        self.actual_line.set_data(x, np.asarray(actual, dtype=float))
+        ax = self.ax
+        ax.set_xticks(x)
+        ax.set_xlim(-0.5, len(labels) - 0.5)
+        ax.set_xticklabels(labels, rotation=45, ha="right")
+        ax.set_xlabel(axis_label, fontsize=12)
+        self.title.set_text(title)
+        self.empty_text.set_visible(bool(np.isnan(projected).all()))
+        ax.relim()
+        ax.autoscale_view(scalex=False)
+
+class CategoryChart(Chart):
+    """Projected vs. actual totals for each category of one month."""
+
+    kind = "categories"
+
+    def __init__(self, dpi=100):
+        super().__init__(dpi)
+        ax = self.ax
+
+        # Bars are added or removed as the number of categories changes, and otherwise reused
+        self.projected_bars = []
+        self.actual_bars = []
+
+        # Customize the chart
+        ax.set_xlabel("Category", fontsize=12)
+        ax.legend(handles=[Patch(color="blue", alpha=0.7, label="Projected Cost"),
+                           Patch(color="green", alpha=0.7, label="Actual Cost")])
+        ax.grid(True, linestyle="--", alpha=0.6)
+
+    def update(self, performance, month, year):
+        """Resize the bars to a month's totals, as returned by BudgetFrame.category_performance."""
+        categories = list(performance.index)
+        ax = self.ax
+
+        # Grow or shrink the pool of bars to one pair per category
+        count = len(self.projected_bars)
+        if len(categories) > count:
+            x = np.arange(count, len(categories))
+            self.projected_bars.extend(ax.bar(x, 0, width=BAR_WIDTH, align="center", color="blue", alpha=0.7))
+            self.actual_bars.extend(ax.bar(x + BAR_WIDTH, 0, width=BAR_WIDTH, align="center", color="green", alpha=0.7))
+        for bars in (self.projected_bars, self.actual_bars):
+            while len(bars) > len(categories):
+                bars.pop().remove()
+
+        for bar, value in zip(self.projected_bars, performance["projected"].to_numpy()):
+            bar.set_height(value)
+        for bar, value in zip(self.actual_bars, performance["actual"].to_numpy()):
+            bar.set_height(value)
+        ax.set_xticks(np.arange(len(categories)) + BAR_WIDTH / 2)
+        ax.set_xticklabels(categories, rotation=45, ha="right")
+        self.title.set_text(f"Category Performance, {month} {year}")
+        self.empty_text.set_visible(not categories)
+        ax.relim()
+        ax.autoscale_view()
+
+class RenderCache:
+    """Least recently used cache of rendered charts."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def peek(self, key):
+        """Return whether a key is cached, without counting a hit or refreshing it."""
+        return key in self.entries
+
+    def get(self, key):
+        pixmap = self.entries.get(key)
+        if pixmap is None:
+            self.misses += 1
+            count("charts.cache_misses")
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        count("charts.cache_hits")
+        return pixmap
+
+    def put(self, key, pixmap):
+        self.entries[key] = pixmap
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+class ChartRenderer(QObject):
+    """Renders the budget charts on a background thread, reusing earlier renders while their data is unchanged.
+
+    A cache key is (chart kind, period, size, version), where the version is
+    the newest BudgetData.month_versions entry among the months the chart
+    shows. An edit therefore only invalidates the charts that include it.
+
+    Each job gets an immutable snapshot: the DataFrame of the chart's months
+    that BudgetFrame.frame() returned when it was submitted. Aggregation and Agg rasterization both run
+    on the worker, and the image comes back through a queued signal. A newer
+    request for the same chart kind supersedes older ones, which are
+    cancelled if they have not started and discarded if they have.
+    """
+
+    # (chart kind, pixmap) once the newest request for that kind is ready;
+    # the pixmap is null if the render failed
+    chart_ready = pyqtSignal(str, QPixmap)
+
+    # Worker -> GUI thread hand-off: (chart kind, cache key, generation, image)
+    _rendered = pyqtSignal(str, object, int, QImage)
+
+    def __init__(self, budget_data, analytics, cache_size=CACHE_SIZE):
+        super().__init__()
+        self.budget_data = budget_data
+        self.analytics = analytics  # BudgetFrame supplying the chart data
+        self.cache = RenderCache(cache_size)
+        self.charts = {TrendsChart.kind: TrendsChart(), CategoryChart.kind: CategoryChart()}  # Only touched by the worker
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="charts")
+        self.generations = {kind: 0 for kind in self.charts}  # Number of the newest request per kind
+        self.futures = {}  # kind -> Future of the newest request
+        self._rendered.connect(self._on_rendered)  # Queued, since it is emitted from the worker
+
+    def period_version(self, first, last):
+        """Return the newest change version among the months with keys in [first, last)."""
+        month_versions = self.budget_data.month_versions
+        if last - first > len(month_versions):
+            return max((version for key, version in month_versions.items() if first <= key < last), default=0)
+        return max(month_versions.get(key, 0) for key in range(first, last))
+
+    def trends(self, resolution, year, width, height):
+        """Request the trends chart that ends with the selected year, at a resolution from TREND_RESOLUTIONS.
+
+        Returns the QPixmap straight away if it is cached. Otherwise returns None
+        and emits chart_ready once the render finishes.
+        """
+        if resolution == MONTH:
+            first = int(year) * 12
+            return self._request(TrendsChart.kind, (resolution, year), width, height,
+                                 self.period_version(first, first + 12), (first, first + 12))
+        span = SPANS[resolution]
+        last = bucket_of(resolution, year, "December")
+        first = last - TREND_RESOLUTIONS[resolution][1] + 1
+        version = self.period_version(first * span, (last + 1) * span)
+        cache_key = (TrendsChart.kind, (resolution, year), width, height, version)
+        # Rollup totals are a handful of lookups, so they are read here and handed to the worker as they are
+        totals = None if self.cache.peek(cache_key) else self.budget_data.get_rollup(resolution, first, last)
+        return self._request(TrendsChart.kind, (resolution, year), width, height, version, data=(first, totals))
+
+    def categories(self, month, year, width, height):
+        """Request the category performance chart for a month, like trends()."""
+        first = month_key(month, year)
+        return self._request(CategoryChart.kind, (month, year), width, height, self.period_version(first, first + 1),
+                             (first, first + 1))
+
+    def shutdown(self):
+        """Cancel queued renders and wait for the running one to finish."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _request(self, kind, period, width, height, version, keys=None, data=None):
+        self.generations[kind] += 1
+        generation = self.generations[kind]
+        previous = self.futures.pop(kind, None)
+        if previous is not None:
+            previous.cancel()  # Only succeeds if it has not started; otherwise it is dropped on arrival
+        key = (kind, period, width, height, version)
+        pixmap = self.cache.get(key)
+        if pixmap is not None:
+            return pixmap
+        if data is None:
+            data = self.analytics.frame(*keys)  # Only the months this chart shows
+        future = self.executor.submit(self._render, kind, period, width, height, data, generation)
+        future.add_done_callback(lambda done: self._finish(done, kind, key, generation))
+        self.futures[kind] = future
+        return None
+
+    @timed()
+    def _render(self, kind, period, width, height, data, generation):
+        """Aggregate and rasterize one chart. Runs on the worker thread.
+
+        data is either a BudgetFrame snapshot or, for rollup trends, the
+        (first bucket, totals) already read from BudgetData.get_rollup.
+        """
+        if generation != self.generations[kind]:
+            return None  # Superseded while it was queued
+        chart = self.charts[kind]
+        if kind == CategoryChart.kind:
+            month, year = period
+            chart.update(self.analytics.category_performance(month, year, data), month, year)
+            return chart.render(width, height)
+        resolution, year = period
+        if resolution == MONTH:
+            trends = self.analytics.year_trends(year, data)
+            chart.update(MONTHS, trends["projected"].to_numpy(), trends["actual"].to_numpy(),
+                         f"Monthly Trends {year}", "Month")
+        else:
+            first, totals = data
+            labels = [bucket_label(resolution, bucket) for bucket in range(first, first + len(totals))]
+            projected = [np.nan if total is None else total[0] for total in totals]
+            actual = [np.nan if total is None else total[1] for total in totals]
+            title, axis_label = TREND_RESOLUTIONS[resolution][0], resolution.capitalize()
+            chart.update(labels, projected, actual, f"{title} Trends to {labels[-1]}", axis_label)
+        return chart.render(width, height)
+
+    def _finish(self, future, kind, key, generation):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self._rendered.emit(kind, None, generation, QImage())
+            return
+        image = future.result()
+        if image is not None:
+            self._rendered.emit(kind, key, generation, image)
+
+    def _on_rendered(self, kind, key, generation, image):
+        pixmap = QPixmap.fromImage(image)
+        if key is not None:
+            self.cache.put(key, pixmap)  # Worth keeping even if superseded, in case the user flicks back
+        if generation == self.generations[kind]:
+            self.futures.pop(kind, None)
+            self.chart_ready.emit(kind, pixmap)
@@ -0,0 +1,134 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Set FAMILYBUDGET_INSTRUMENT=1 to time the hot paths. When it is not set,
+# timed() hands back the undecorated function, so nothing is paid at all.
+ENABLED = bool(os.environ.get("FAMILYBUDGET_INSTRUMENT"))
+
+# Most recent durations kept per timer for the percentiles
+SAMPLES = 2048
+# Most recent calls kept for the Chrome trace
+TRACE_EVENTS = 100000
+
+class Timer:
+    """Call count and durations of one instrumented function, in seconds."""
+
+    __slots__ = ("calls", "total", "max", "samples")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLES)
+
+    def add(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.samples.append(elapsed)
+
+    def percentile(self, fraction):
+        """Return the duration below which a fraction of the recent calls fall."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class Registry:
+    """Timers, counters and trace events, shared by every thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+        self.events = deque(maxlen=TRACE_EVENTS)  # (name, start, elapsed, thread id)
+        self.started_at = time.perf_counter()
+        self.profiler = None
+
+    def record(self, name, start, elapsed):
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = Timer()
+            timer.add(elapsed)
+            self.events.append((name, start, elapsed, threading.get_ident()))
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        with self.lock:
+            self.timers.clear()
+            self.counters.clear()
+            self.events.clear()
+
+    def timer_rows(self):
+        """Return (name, calls, p50 ms, p95 ms, max ms, total ms) for every timer, slowest total first."""
+        with self.lock:
+            rows = [(name, timer.calls, timer.percentile(0.5) * 1000, timer.percentile(0.95) * 1000,
+                     timer.max * 1000, timer.total * 1000) for name, timer in self.timers.items()]
+        return sorted(rows, key=lambda row: -row[5])
+
+    def counter_rows(self):
+        """Return (name, value) for every counter, by name."""
+        with self.lock:
+            return sorted(self.counters.items())
+
+    def start_profile(self):
+        """Start cProfile on the calling thread, which for the GUI is the main thread."""
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profile(self, path=None):
+        """Stop cProfile and, given a path, write its statistics there for pstats or snakeviz."""
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            profiler.disable()
+            if path is not None:
+                profiler.dump_stats(path)
+
+    def save_trace(self, path):
+        """Write the recorded calls as a Chrome trace, for chrome://tracing or Perfetto."""
+        with self.lock:
+            events = list(self.events)
+        pid = os.getpid()
+        trace = [{"name": name, "ph": "X", "ts": round((start - self.started_at) * 1e6, 1),
+                  "dur": round(elapsed * 1e6, 1), "pid": pid, "tid": thread}
+                 for name, start, elapsed, thread in events]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file)
+        return len(trace)
+
+registry = Registry()
+
+def timed(name=None):
+    """Decorator that times every call of a function under name (default: its qualified name)."""
+    def decorate(function):
+        if not ENABLED:
+            return function
+        label = name or function.__qualname__
+        record = registry.record
+        clock = time.perf_counter
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(label, start, clock() - start)
+        return wrapper
+    return decorate
+
+def count(name, amount=1):
+    """Add to a counter, such as bytes written."""
+    if ENABLED:
+        registry.count(name, amount)